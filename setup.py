@@ -17,5 +17,6 @@ setup(
     long_description_content_type='text/x-rst',
     url='https://github.com/xina-ai/xinaprocessor',
     description="Xina processing library",
-    packages=find_packages(include=['xinaprocessor'])
+    packages=find_packages(include=['xinaprocessor']),
+    entry_points={'console_scripts': ['xinaprocessor=xinaprocessor.cli:main']}
 )
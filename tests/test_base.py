@@ -0,0 +1,142 @@
+import pytest
+from xinaprocessor.base import BaseCleaner
+import time
+
+
+def slow_filter(line):
+    time.sleep(0.0001)
+    return "x" not in line
+
+
+def test_adaptive_filters_reorder_and_keep_results():
+    lines = [f"{'x' if i % 5 else ''}line {i} {'#' * (i % 3)}" for i in range(200)]
+    adaptive = BaseCleaner(stream=True)
+    adaptive.strip()._filter_lines(slow_filter)
+    adaptive.drop_lines_contain("line 1").set_adaptive_filters(reorder_every=2)
+    reference = BaseCleaner(stream=True)
+    reference.strip()._filter_lines(slow_filter)
+    reference.drop_lines_contain("line 1")
+
+    for start in range(0, 200, 20):
+        assert adaptive._sequential.apply(lines[start:start + 20]) == \
+            reference._sequential.apply(lines[start:start + 20])
+    assert adaptive._sequential._orders[(1, 2)] == [2, 1]
+
+
+def test_adaptive_filters_keep_impure_filters_in_place():
+    lines = [f"{'x' if i % 5 else ''}line {i}" for i in range(200)]
+    report, reference_report = [], []
+    adaptive = BaseCleaner(stream=True)
+    adaptive._filter_lines(slow_filter).quality_filter(max_chars=7, report=report)
+    adaptive.drop_lines_contain("line 1").set_adaptive_filters(reorder_every=2)
+    reference = BaseCleaner(stream=True)
+    reference._filter_lines(slow_filter).quality_filter(max_chars=7, report=reference_report)
+    reference.drop_lines_contain("line 1")
+
+    for start in range(0, 200, 20):
+        assert adaptive._sequential.apply(lines[start:start + 20]) == \
+            reference._sequential.apply(lines[start:start + 20])
+    assert report == reference_report
+    assert adaptive._sequential._runs() == [[0], [1], [2]]
+
+
+def build_joined_pipeline(cleaner):
+    return cleaner.remove_links().remove_hashtags().remove_mentions() \
+        .replace_repeated_chars(3, 1).remove_numbers().remove_extra_spaces()
+
+
+def test_batch_join_matches_line_by_line():
+    lines = ["@user see https://t.co/x #tag end", "#last", "", "", "sooooo 123  good @a",
+             "www.site.com/page?x=1 hi\n", "@b: reply #one #two", "###", "\x1e odd line"] * 3
+    expected = build_joined_pipeline(BaseCleaner(list(lines))).lines
+    joined = BaseCleaner(list(lines)).set_batch_join(batch_size=4)
+    assert build_joined_pipeline(joined).lines == expected
+
+    stream = build_joined_pipeline(BaseCleaner(stream=True).set_batch_join())
+    assert stream._sequential.apply(lines) == expected
+    assert stream._sequential.apply(lines[:-1]) == expected[:-1]
+
+
+def test_line_cache_reuses_results():
+    lines = ["  RT @user: same text  ", "", "other line http://x.y", "  RT @user: same text  "] * 50
+    expected = BaseCleaner(list(lines)).strip().remove_links().drop_empty_lines().lines
+    cleaner = BaseCleaner(list(lines)).set_line_cache(max_entries=10)
+    assert cleaner.strip().remove_links().drop_empty_lines().lines == expected
+    # three distinct lines for each of the three operations
+    assert cleaner.line_cache.misses == 9
+    assert cleaner.line_cache.hit_rate > 0.9
+
+    stream = BaseCleaner(stream=True).set_line_cache(max_entries=2)
+    stream.strip().remove_links().drop_empty_lines().split_lines_on(" ")
+    reference = BaseCleaner(list(lines)).strip().remove_links().drop_empty_lines().split_lines_on(" ")
+    assert stream._sequential.apply(lines) == reference.lines
+    assert stream._sequential.apply(lines) == reference.lines
+    stats = stream.line_cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 2
+
+
+def test_line_cache_shared_by_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    lines = [f"  line {i % 40} http://x.y  " for i in range(2000)]
+    stream = BaseCleaner(stream=True).set_line_cache(max_entries=16)
+    stream.strip().remove_links().strip().drop_empty_lines()
+    expected = BaseCleaner(list(lines)).strip().remove_links().strip().drop_empty_lines().lines
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(stream._sequential.apply, [lines] * 16))
+    assert all(result == expected for result in results)
+    cache = stream.line_cache
+    assert cache.hits + cache.misses == 16 * len(lines)
+    assert len(cache) <= 16
+    assert cache.nbytes == sum(size for _, size in cache._data.values())
+
+
+def test_clean_iter_is_lazy():
+    consumed = []
+
+    def source():
+        for i in range(100):
+            consumed.append(i)
+            yield f"  line {i} http://x.y  " if i % 3 else ""
+
+    cleaner = BaseCleaner(stream=True).strip().remove_links().strip().drop_empty_lines()
+    cleaned = cleaner.clean_iter(source(), batch_size=10)
+    assert next(cleaned) == "line 1"
+    assert len(consumed) == 10
+    expected = BaseCleaner([f"  line {i} http://x.y  " if i % 3 else "" for i in range(100)]) \
+        .strip().remove_links().strip().drop_empty_lines().lines
+    assert ["line 1", *cleaned] == expected
+
+    with pytest.raises(ValueError):
+        BaseCleaner(["a"]).strip().clean_iter(["a"])
+
+
+def test_line_cache_separates_configurations_and_keeps_reports():
+    from functools import partial
+    from xinaprocessor.helper import replace_repeated_chars
+
+    class Truncate:
+        def __init__(self, n):
+            self.n = n
+
+        def __call__(self, line):
+            return line[:self.n]
+
+    cache = BaseCleaner(stream=True).set_line_cache().line_cache
+    lines = ["ههههههه", "سطر طويل جدا"]
+    for repeated, n in [(1, 2), (3, 4)]:
+        stream = BaseCleaner(stream=True).set_line_cache(cache=cache)
+        stream._map_lines(partial(replace_repeated_chars, repeated=repeated, keep_char=1))._map_lines(Truncate(n))
+        reference = BaseCleaner(list(lines))
+        reference._map_lines(partial(replace_repeated_chars, repeated=repeated, keep_char=1))._map_lines(Truncate(n))
+        assert stream._sequential.apply(lines) == reference.lines
+
+    dropped = []
+    cleaner = BaseCleaner(["a", "a", "b c d"] * 3).set_line_cache()
+    assert cleaner.quality_filter(min_words=2, report=dropped).lines == ["b c d"] * 3
+    assert len(dropped) == 6
+    dropped.clear()
+    stream = BaseCleaner(stream=True).set_line_cache()
+    stream.strip().quality_filter(min_words=2, report=dropped)
+    stream._sequential.apply(["a", "a", "b c d"])
+    stream._sequential.apply(["a", "a", "b c d"])
+    assert len(dropped) == 4
@@ -1,3 +1,9 @@
+import gzip
+import json
+import os
+import asyncio
+import threading
+import time
 from xinaprocessor.cleaners import *
 from test_const import *
 import pytest
@@ -100,3 +106,420 @@ def test_remove_english_punctuations(inp_text, target_text):
 def test_remove_punctuations(inp_text, target_text):
     cleaner = TextCleaner(inp_text)
     assert cleaner.remove_punctuations().text.strip() == target_text.strip()
+
+
+def test_folder_aclean_files(tmp_path):
+    folder, savedir = tmp_path / "data", tmp_path / "cleaned"
+    folder.mkdir()
+    for i in range(5):
+        (folder / f"{i}.txt").write_text(
+            "\n".join(f"نص {j} http://x.com" for j in range(100)), encoding="utf8")
+    cleaner = FolderStreamCleaner(str(folder), str(savedir), n_jobs=2)
+    cleaner.apply.remove_links().strip()
+    asyncio.run(cleaner.aclean_files(max_open_files=2, max_inflight_bytes=256, batch_bytes=64))
+    for i in range(5):
+        lines = (savedir / f"{i}.txt").read_text(encoding="utf8").splitlines()
+        assert lines == [f"نص {j}" for j in range(100)]
+
+
+def test_folder_aclean_files_charges_encoded_bytes(tmp_path, monkeypatch):
+    from xinaprocessor.classes import ByteBudget
+    folder, savedir = tmp_path / "data", tmp_path / "cleaned"
+    folder.mkdir()
+    (folder / "a.txt").write_text("\n".join(f"نص عربي طويل {j}" for j in range(200)), encoding="utf8")
+    released = []
+    release = ByteBudget.release
+
+    async def recording(self, n_bytes):
+        released.append(n_bytes)
+        await release(self, n_bytes)
+    monkeypatch.setattr(ByteBudget, "release", recording)
+    cleaner = FolderStreamCleaner(str(folder), str(savedir))
+    cleaner.apply.strip()
+    asyncio.run(cleaner.aclean_files(max_inflight_bytes=1024, batch_bytes=256))
+    assert sum(released) == os.path.getsize(folder / "a.txt")
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_folder_clean_files_scheduled(tmp_path, compression):
+    folder, savedir = tmp_path / "data", tmp_path / "cleaned"
+    folder.mkdir()
+    (folder / "big.txt").write_text(
+        "header\n" + "\n".join(f"نص {j} http://x.com" for j in range(2000)), encoding="utf8")
+    for i in range(20):
+        (folder / f"{i}.txt").write_text(f"سطر {i} http://x.com\n", encoding="utf8")
+    cleaner = FolderStreamCleaner(str(folder), str(savedir), header=True, n_jobs=3,
+                                  compression=compression)
+    cleaner.apply.remove_links().strip()
+    tasks = cleaner._schedule(chunk_bytes=4096, pack_bytes=100)
+    assert len(tasks) > 10 + 4
+    cleaner.clean_files(chunk_bytes=4096, pack_bytes=100)
+    opener = gzip.open if compression else open
+    with opener(savedir / "big.txt", "rt", encoding="utf8") as f:
+        assert f.read().splitlines() == ["header"] + [f"نص {j}" for j in range(2000)]
+    assert not [name for name in os.listdir(savedir) if ".part" in name]
+    assert len(os.listdir(savedir)) == 21
+
+
+def test_folder_clean_files_chunk_failure(tmp_path):
+    folder, savedir = tmp_path / "data", tmp_path / "cleaned"
+    folder.mkdir()
+    (folder / "big.txt").write_text("\n".join(f"سطر {j}" for j in range(2000)), encoding="utf8")
+    cleaner = FolderStreamCleaner(str(folder), str(savedir), n_jobs=3)
+    cleaner.apply.strip()._map_lines(crash_on_line)
+    crash_on["line"] = "سطر 1500"
+    try:
+        with pytest.raises(RuntimeError):
+            cleaner.clean_files(chunk_bytes=4096)
+    finally:
+        crash_on["line"] = None
+    assert os.listdir(savedir) == []
+
+
+def test_folder_file_discovery_filters(tmp_path):
+    import re
+    folder = tmp_path / "data"
+    (folder / "sub" / "deep").mkdir(parents=True)
+    for path in ["a.txt", "b.csv", ".hidden.txt", "sub/c.txt", "sub/skip_d.txt", "sub/deep/e.txt"]:
+        (folder / path).write_text("نص http://x.com\n" * (3 if "e." in path else 1), encoding="utf8")
+    cleaner = FolderStreamCleaner(str(folder), str(tmp_path / "out"), include_subdir=True,
+                                  include="*.txt", exclude=re.compile(r"(^|/)skip_"), max_size=40,
+                                  max_open_files=2, n_jobs=3)
+    relpaths = sorted(os.path.relpath(path, folder) for path in cleaner.iter_files())
+    assert relpaths == ["a.txt", os.path.join("sub", "c.txt")]
+    cleaner.apply.remove_links().strip()
+    cleaner.clean_files()
+    assert (tmp_path / "out" / "sub" / "c.txt").read_text(encoding="utf8") == "نص\n"
+    with pytest.raises(ValueError):
+        FolderStreamCleaner(str(folder), include="*.json", include_subdir=True)
+
+
+def test_folder_aclean_files_uses_discovery(tmp_path, monkeypatch):
+    folder, savedir = tmp_path / "data", tmp_path / "cleaned"
+    (folder / "sub").mkdir(parents=True)
+    for i in range(6):
+        (folder / "sub" / f"{i}.txt").write_text(f"نص {i} http://x.com\n", encoding="utf8")
+    (folder / "notes.csv").write_text("skip\n", encoding="utf8")
+    cleaner = FolderStreamCleaner(str(folder), str(savedir), include_subdir=True, include="*.txt",
+                                  max_open_files=4, n_jobs=2)
+    cleaner.apply.remove_links().strip()
+    handles, peak, lock = [0], [0], threading.Lock()
+    prepare_clean, close_handlers = FileStreamCleaner._prepare_clean, FileStreamCleaner._close_handlers
+
+    def counting_prepare(self):
+        # an input and an output handle per file
+        with lock:
+            handles[0] += 2
+            peak[0] = max(peak[0], handles[0])
+        time.sleep(0.01)
+        return prepare_clean(self)
+
+    def counting_close(self):
+        with lock:
+            handles[0] -= 2
+        return close_handlers(self)
+    monkeypatch.setattr(FileStreamCleaner, "_prepare_clean", counting_prepare)
+    monkeypatch.setattr(FileStreamCleaner, "_close_handlers", counting_close)
+    monkeypatch.setattr(FolderStreamCleaner, "files", property(lambda self: pytest.fail("eager listing")))
+    asyncio.run(cleaner.aclean_files())
+    assert sorted(os.listdir(savedir / "sub")) == [f"{i}.txt" for i in range(6)]
+    assert not (savedir / "notes.csv").exists()
+    assert peak[0] <= 4
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_file_stream_clean(tmp_path, threaded):
+    filepath, savepath = tmp_path / "data.txt", tmp_path / "cleaned.txt"
+    filepath.write_text(
+        "\n".join(f"نص {i} #وسم http://x.com" for i in range(1000)), encoding="utf8")
+    cleaner = FileStreamCleaner(str(filepath), str(savepath))
+    cleaner.remove_links().remove_hashtags().remove_extra_spaces().strip()
+    cleaner.clean(n_lines=7, threaded=threaded, queue_size=2)
+    cleaner._close_handlers()
+    lines = savepath.read_text(encoding="utf8").splitlines()
+    assert lines == [f"نص {i}" for i in range(1000)]
+
+
+def test_file_stream_clean_csv_mode(tmp_path):
+    filepath, savepath = tmp_path / "data.csv", tmp_path / "cleaned.csv"
+    filepath.write_text('id,text,label\n1,"نص, http://x.com",a\n2,http://y.com,b\n3,"سطر\nثاني",c\n',
+                        encoding="utf8")
+    cleaner = FileStreamCleaner(str(filepath), str(savepath), sep=",", columns=[1], header=True,
+                                csv_mode=True)
+    cleaner.remove_links().strip().drop_empty_lines()
+    cleaner.clean(n_lines=2)
+    cleaner._close_handlers()
+    assert savepath.read_text(encoding="utf8") == 'id,text,label\n1,"نص,",a\n3,"سطر\nثاني",c\n'
+
+
+def test_jsonl_stream_cleaner(tmp_path):
+    filepath, savepath = tmp_path / "data.jsonl", tmp_path / "cleaned.jsonl"
+    records = [{"id": 1, "text": "نص http://x.com", "title": "#وسم عنوان", "meta": {"a": 1}},
+               {"id": 2, "text": "http://y.com", "title": "عنوان"},
+               {"id": 3, "text": "سطر", "meta": None}]
+    filepath.write_text("\n".join(json_dumps(r) for r in records) + "\n\n", encoding="utf8")
+    cleaner = JsonlStreamCleaner(str(filepath), str(savepath), fields=["text", "title"])
+    cleaner.remove_links().remove_hashtags().strip().drop_empty_lines()
+    cleaner.clean(n_lines=2)
+    cleaner._close_handlers()
+    lines = savepath.read_text(encoding="utf8").splitlines()
+    assert [json_loads(line) for line in lines] == [
+        {"id": 1, "text": "نص", "title": "عنوان", "meta": {"a": 1}},
+        {"id": 3, "text": "سطر", "meta": None}]
+
+
+def test_jsonl_stream_cleaner_keeps_non_object_lines(tmp_path):
+    filepath, savepath = tmp_path / "data.jsonl", tmp_path / "cleaned.jsonl"
+    filepath.write_text('[1, "a"]\n"نص http://x.com"\n3\nnull\n{"text": "نص http://x.com", "url": "a/b"}\n',
+                        encoding="utf8")
+    cleaner = JsonlStreamCleaner(str(filepath), str(savepath))
+    cleaner.remove_links().strip()
+    cleaner.clean(n_lines=2)
+    cleaner._close_handlers()
+    assert savepath.read_text(encoding="utf8").splitlines() == [
+        '[1,"a"]', '"نص http://x.com"', "3", "null", '{"text":"نص","url":"a/b"}']
+
+
+@pytest.mark.parametrize("inp_text", [text_test_example_8, text_test_example_10, text_test_example_13])
+def test_compact_text_cleaner(inp_text):
+    cleaner = TextCleaner(inp_text, compact=True)
+    reference = TextCleaner(inp_text)
+    for c in (cleaner, reference):
+        c.remove_links().keep_arabic_and_numbers_only().split_lines_on(" ").drop_empty_lines()
+    assert isinstance(cleaner.lines, CompactLines)
+    assert list(cleaner) == list(reference.lines)
+    assert len(cleaner) == len(reference)
+    assert cleaner.text == reference.text
+    assert cleaner[len(cleaner) - 1] == reference[len(reference) - 1]
+
+
+@pytest.mark.parametrize("header", [None, True])
+def test_lazy_file_cleaner(tmp_path, header):
+    filepath = tmp_path / "data.txt"
+    filepath.write_text("\n  \n" + "\n".join(f" سطر {i} http://x.com " for i in range(50)) + "\n\n",
+                        encoding="utf8")
+    lazy = FileCleaner(str(filepath), header=header, lazy=True)
+    eager = FileCleaner(str(filepath), header=header)
+    assert isinstance(lazy.lines, MappedLines)
+    assert len(lazy) == len(eager)
+    assert lazy.head(3) == eager.head(3)
+    assert lazy.tail(3) == eager.tail(3)
+    assert lazy[10] == eager[10]
+    assert lazy.sample(5, seed=1) == eager.sample(5, seed=1)
+    assert lazy.remove_links().strip().lines == eager.remove_links().strip().lines
+    assert isinstance(lazy.lines, list)
+
+
+def test_lazy_file_cleaner_does_not_count_lines(tmp_path):
+    filepath = tmp_path / "data.txt"
+    filepath.write_text("\n".join(f"سطر {i}" for i in range(100)) + "\n", encoding="utf8")
+    lazy = FileCleaner(str(filepath), lazy=True)
+    assert lazy.head(2) == ["سطر 0", "سطر 1"]
+    assert lazy.tail(2) == ["سطر 98", "سطر 99"]
+    assert lazy[5] == "سطر 5"
+    assert lazy.lines[-1] == "سطر 99"
+    assert lazy.lines[3:5] == ["سطر 3", "سطر 4"]
+    assert lazy.lines._len is None
+    with pytest.raises(IndexError):
+        lazy.head(100)
+    with pytest.raises(IndexError):
+        lazy[100]
+
+
+@pytest.mark.parametrize("content", ["", " \n\t\n"])
+def test_lazy_file_cleaner_empty_file(tmp_path, content):
+    filepath = tmp_path / "empty.txt"
+    filepath.write_text(content, encoding="utf8")
+    lazy = FileCleaner(str(filepath), lazy=True)
+    assert len(lazy) == 0
+    assert list(lazy) == []
+    with pytest.raises(IndexError):
+        lazy[0]
+    if not content:
+        assert len(FileCleaner(str(filepath))) == 0
+
+
+def test_lazy_file_cleaner_add_text(tmp_path):
+    filepath = tmp_path / "data.txt"
+    filepath.write_text("سطر 1\nسطر 2\n", encoding="utf8")
+    lazy = FileCleaner(str(filepath), lazy=True)
+    lazy.add_text("سطر 3\nسطر 4", sep="\n")
+    assert lazy.lines == ["سطر 1", "سطر 2", "سطر 3", "سطر 4"]
+    other = FileCleaner(str(filepath), lazy=True)
+    other += FileCleaner(str(filepath), lazy=True)
+    assert other.lines == ["سطر 1", "سطر 2"] * 2
+
+
+def test_file_stream_clean_split(tmp_path):
+    filepath, savepath = tmp_path / "data.txt", tmp_path / "cleaned.txt"
+    filepath.write_text("\n".join(f"سطر {i % 300} http://x.com" for i in range(1000)), encoding="utf8")
+    cleaner = FileStreamCleaner(str(filepath), str(savepath))
+    cleaner.remove_links().strip()
+    paths = cleaner.clean_split({"train": 0.8, "valid": 0.1, "test": 0.1}, seed=5)
+    assert paths == [str(tmp_path / f"cleaned_{name}.txt") for name in ("train", "valid", "test")]
+    splits = [set(open(path, encoding="utf8").read().splitlines()) for path in paths]
+    assert sum(map(len, splits)) == 300
+    assert not (splits[0] & splits[1] or splits[0] & splits[2] or splits[1] & splits[2])
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_file_stream_clean_split_last_line(tmp_path, seed):
+    filepath, savepath = tmp_path / "data.txt", tmp_path / "cleaned.txt"
+    filepath.write_text("dup\nx\ndup", encoding="utf8")
+    cleaner = FileStreamCleaner(str(filepath), str(savepath))
+    cleaner.remove_links()
+    paths = cleaner.clean_split({"train": 0.5, "test": 0.5}, seed=seed)
+    splits = [open(path, encoding="utf8").read().splitlines() for path in paths]
+    assert sorted(split.count("dup") for split in splits) == [0, 2]
+
+
+@pytest.mark.parametrize("key", [None, "text", lambda record: record["text"]])
+def test_jsonl_clean_split_ignores_ids(tmp_path, key):
+    filepath, savepath = tmp_path / "data.jsonl", tmp_path / "cleaned.jsonl"
+    records = [{"id": i, "text": f"نص {i % 50} http://x.com"} for i in range(400)]
+    filepath.write_text("\n".join(json_dumps(r) for r in records), encoding="utf8")
+    cleaner = JsonlStreamCleaner(str(filepath), str(savepath))
+    cleaner.remove_links().strip()
+    paths = cleaner.clean_split({"train": 0.5, "test": 0.5}, seed=1, key=key)
+    texts = [{json_loads(line)["text"] for line in open(path, encoding="utf8")} for path in paths]
+    assert len(texts[0] | texts[1]) == 50
+    assert not texts[0] & texts[1]
+
+
+crash_on = {"line": None}
+
+
+def crash_on_line(line):
+    if line.strip() == crash_on["line"]:
+        raise RuntimeError("simulated crash")
+    return line
+
+
+@pytest.mark.parametrize("suffix", [".txt", ".txt.gz"])
+def test_file_stream_clean_resume(tmp_path, suffix):
+    filepath, savepath = tmp_path / "data.txt", tmp_path / f"cleaned{suffix}"
+    filepath.write_text("\n".join(f"سطر {i} http://x.com" for i in range(1000)) + "\n", encoding="utf8")
+    cleaner = FileStreamCleaner(str(filepath), str(savepath))
+    cleaner.remove_links().strip()._map_lines(crash_on_line)
+    crash_on["line"] = "سطر 537"
+    with pytest.raises(RuntimeError):
+        cleaner.clean(n_lines=50, checkpoint_interval=0)
+    checkpoint = json.load(open(str(savepath) + ".ckpt"))
+    assert 0 < checkpoint["input_offset"] < os.path.getsize(filepath)
+
+    crash_on["line"] = None
+    cleaner.clean(n_lines=50, resume=True)
+    text = gzip.open(savepath, "rt", encoding="utf8").read() if suffix.endswith(".gz") else \
+        savepath.read_text(encoding="utf8")
+    assert text.splitlines() == [f"سطر {i}" for i in range(1000)]
+    assert json.load(open(str(savepath) + ".ckpt"))["complete"]
+
+
+def test_file_stream_clean_resume_with_report(tmp_path):
+    filepath, savepath = tmp_path / "data.txt", tmp_path / "cleaned.txt"
+    filepath.write_text("\n".join(f"سطر {i}" if i % 2 else "x" for i in range(1000)) + "\n", encoding="utf8")
+    report = []
+    cleaner = FileStreamCleaner(str(filepath), str(savepath))
+    cleaner.strip().quality_filter(min_words=2, report=report)._map_lines(crash_on_line)
+    crash_on["line"] = "سطر 537"
+    with pytest.raises(RuntimeError):
+        cleaner.clean(n_lines=50, checkpoint_interval=0)
+    assert report
+    crash_on["line"] = None
+    # the report grew while cleaning, the pipeline is still the same
+    cleaner.clean(n_lines=50, resume=True)
+    assert savepath.read_text(encoding="utf8").splitlines() == [f"سطر {i}" for i in range(1, 1000, 2)]
+
+
+def test_file_stream_clean_resume_with_lost_output(tmp_path):
+    filepath, savepath = tmp_path / "data.txt", tmp_path / "cleaned.txt"
+    filepath.write_text("\n".join(f"سطر {i} http://x.com" for i in range(1000)) + "\n", encoding="utf8")
+    cleaner = FileStreamCleaner(str(filepath), str(savepath))
+    cleaner.remove_links().strip()._map_lines(crash_on_line)
+    crash_on["line"] = "سطر 537"
+    with pytest.raises(RuntimeError):
+        cleaner.clean(n_lines=50, checkpoint_interval=0)
+    crash_on["line"] = None
+    # output lost after the checkpoint was written, e.g. by a machine crash
+    os.truncate(savepath, 10)
+    with pytest.warns(UserWarning, match="shorter than its checkpoint"):
+        cleaner.clean(n_lines=50, resume=True)
+    assert savepath.read_text(encoding="utf8").splitlines() == [f"سطر {i}" for i in range(1000)]
+
+
+def test_drop_lines_by_script_ratio():
+    cleaner = TextCleaner("نص عربي فقط\nنص عربي مع english words\nonly english\nگردد")
+    assert cleaner.drop_lines_by_script_ratio(arabic_min=0.4, persian_max=0).lines == [
+        "نص عربي فقط", "نص عربي مع english words"]
+    assert TextCleaner("نص عربي en").get_script_profile() == {
+        "punctuation": 0, "digit": 0, "latin": 0.25, "emoji": 0, "persian": 0, "quranic": 0,
+        "harakat": 0, "arabic": 0.75, "other": 0}
+    with pytest.raises(ValueError):
+        cleaner.drop_lines_by_script_ratio(klingon_min=0.5)
+
+
+def test_quality_filter_matches_separate_filters():
+    text = "\n".join(["نص عربي جيد هنا", "قصير", "نص و حرف منفرد هنا", "نص طويل جدا جدا جدا جدا جدا",
+                      "ههههههه نص هنا", "نص!!! ؟؟ هنا", "english text here ok", ""])
+    separate = TextCleaner(text).drop_lines_below_len(2).drop_lines_above_len(5) \
+        .drop_lines_contain_single_char().drop_lines_with_repeated_chars(3) \
+        .drop_lines_above_count("!", 1).drop_lines_by_script_ratio(arabic_min=0.5)
+    dropped = []
+    single = TextCleaner(text).quality_filter(min_words=2, max_words=5, single_char=True, repeated_chars=3,
+                                              max_symbol_count={"!": 1}, script_bounds={"arabic_min": 0.5},
+                                              report=dropped)
+    assert single.lines == separate.lines == ["نص عربي جيد هنا"]
+    assert ("قصير", ["min_words"]) in dropped
+    assert ("english text here ok", ["arabic_min"]) in dropped
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_parallel_text_cleaner(compact):
+    lines = [f"سطر {i} http://x.y/{i} ##" if i % 7 else "" for i in range(3000)]
+    lines[1] = "line with\nnewline"
+    expected = TextCleaner.create_cleaner_from_list(list(lines)) \
+        .remove_links().drop_empty_lines().remove_english_punctuations().lines
+    cleaner = TextCleaner.create_cleaner_from_list(list(lines), compact=compact, n_workers=2)
+    cleaner.set_workers(2, min_lines=100)
+    result = cleaner.remove_links().drop_empty_lines().remove_english_punctuations().lines
+    assert isinstance(result, CompactLines) == compact
+    assert list(result) == expected
+
+
+def test_parallel_text_cleaner_chains_operations_and_keeps_reports(monkeypatch):
+    import xinaprocessor.parallel as parallel
+    calls = []
+    parallel_apply = parallel.parallel_apply
+    monkeypatch.setattr(parallel, "parallel_apply",
+                        lambda lines, operations, n_workers: calls.append(len(operations))
+                        or parallel_apply(lines, operations, n_workers))
+    lines = [f"سطر {i} http://x.y" if i % 3 else "a" for i in range(900)]
+    cleaner = TextCleaner.create_cleaner_from_list(list(lines), n_workers=2)
+    cleaner.set_workers(2, min_lines=100)
+    dropped = []
+    cleaner.remove_links().strip().drop_empty_lines().quality_filter(min_words=2, report=dropped).strip()
+    assert calls == [3]
+    assert len(dropped) == 300
+    assert cleaner.lines == [f"سطر {i}" for i in range(900) if i % 3]
+    assert calls == [3, 1]
+
+
+def test_async_cleaner_batches_requests():
+    texts = [f"  مرحبا http://x.com {i}\n\n  سلام  " if i % 2 else "hello" for i in range(50)]
+
+    def pipeline(cleaner):
+        return cleaner.remove_links().remove_extra_spaces().strip().keep_arabic_only().strip().drop_empty_lines()
+
+    expected = [pipeline(TextCleaner(text)).text for text in texts]
+
+    async def serve():
+        async with AsyncCleaner(pipeline(BaseCleaner(stream=True)), max_batch_size=16, max_wait=0.01) as cleaner:
+            results = await asyncio.gather(*(cleaner.clean(text) for text in texts))
+        return results, cleaner.n_batches
+
+    results, n_batches = asyncio.run(serve())
+    assert results == expected
+    assert n_batches == 4
+
+    with pytest.raises(ValueError):
+        AsyncCleaner(BaseCleaner(stream=True))
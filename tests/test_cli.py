@@ -0,0 +1,70 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from xinaprocessor.base import BaseCleaner
+from xinaprocessor.cli import main, parse_operation
+
+LINES = ["  مرحبا http://x.com  ", "", "سلاااااام #وسم", "hello", "  كتاب  "] * 30
+
+
+def expected_lines():
+    return BaseCleaner(list(LINES)).strip().remove_links().replace_repeated_chars(3, 1) \
+        .keep_arabic_only().drop_empty_lines().lines
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_cli_cleans_stdin(jobs):
+    result = subprocess.run(
+        [sys.executable, "-W", "error::UserWarning", "-m", "xinaprocessor", "-j", jobs, "-b", "7",
+         "--ops", "strip,remove_links,replace_repeated_chars:3:1,keep_arabic_only,drop_empty_lines"],
+        input="\n".join(LINES).encode("utf-8"), capture_output=True, check=True)
+    assert result.stdout.decode("utf-8").splitlines() == expected_lines()
+
+
+def test_cli_cleans_files_with_config(tmp_path, capsys):
+    folder = tmp_path / "data"
+    folder.mkdir()
+    (folder / "a.txt").write_text("\n".join(LINES), encoding="utf8")
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({"ops": ["strip", "remove_links", {"name": "replace_repeated_chars", "args": [3, 1]},
+                                          "keep_arabic_only", "drop_empty_lines"], "batch_size": 8}))
+    assert main(["--config", str(config), str(folder / "a.txt")]) == 0
+    assert capsys.readouterr().out.splitlines() == expected_lines()
+
+    out = tmp_path / "out"
+    assert main(["--config", str(config), str(folder), "-o", str(out)]) == 0
+    with open(out / "a.txt", encoding="utf8") as f:
+        assert f.read().splitlines() == expected_lines()
+
+
+def test_cli_cleans_single_file_to_folder(tmp_path, monkeypatch):
+    import xinaprocessor.cli as cli
+    path = tmp_path / "a.txt"
+    path.write_text("\n".join(LINES), encoding="utf8")
+    calls = []
+    clean_stream = cli.clean_stream
+
+    def recording(sequential, lines, output, batch_size, n_jobs):
+        calls.append((batch_size, n_jobs))
+        return clean_stream(sequential, lines, output, batch_size, n_jobs)
+    monkeypatch.setattr(cli, "clean_stream", recording)
+    out = tmp_path / "out"
+    assert main(["--ops", "strip,remove_links,replace_repeated_chars:3:1,keep_arabic_only,drop_empty_lines",
+                 "-j", "2", "-b", "9", str(path), "-o", str(out)]) == 0
+    assert calls == [(9, 2)]
+    with open(out / "a.txt", encoding="utf8") as f:
+        assert f.read().splitlines() == expected_lines()
+
+
+def test_cli_rejects_unknown_operations():
+    assert parse_operation("replace_repeated_chars:3:1") == ("replace_repeated_chars", [3, 1], {})
+    assert parse_operation("drop_lines_contain:http") == ("drop_lines_contain", ["http"], {})
+    with pytest.raises(ValueError):
+        parse_operation("set_text")
+    for name in ("lines", "text"):
+        with pytest.raises(ValueError):
+            parse_operation(name)
+    with pytest.raises(SystemExit):
+        main(["--ops", "not_an_operation"])
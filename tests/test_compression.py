@@ -0,0 +1,38 @@
+from xinaprocessor.compression import *
+from xinaprocessor.cleaners import FileStreamCleaner
+import pytest
+
+
+@pytest.mark.parametrize("compression, opener", [
+    ("gzip", gzip.open),
+    ("bz2", bz2.open),
+    ("xz", lzma.open),
+])
+def test_parallel_writer_roundtrip(tmp_path, compression, opener):
+    path = str(tmp_path / "out.bin")
+    data = "".join(f"سطر {i}\n" for i in range(5000)).encode("utf8")
+    with ParallelCompressedWriter(path, compression, block_size=1000, n_workers=3) as writer:
+        writer.write(data)
+    assert detect_compression(path) == compression
+    with opener(path, "rb") as f:
+        assert f.read() == data
+
+
+def test_file_stream_clean_compressed(tmp_path):
+    filepath, savepath = tmp_path / "data.txt.gz", tmp_path / "cleaned.txt.gz"
+    with gzip.open(filepath, "wt", encoding="utf8") as f:
+        f.write("\n".join(f"نص {i} http://x.com" for i in range(100)))
+    cleaner = FileStreamCleaner(str(filepath), str(savepath))
+    cleaner.remove_links().strip()
+    cleaner.clean()
+    cleaner._close_handlers()
+    with gzip.open(savepath, "rt", encoding="utf8") as f:
+        assert f.read().splitlines() == [f"نص {i}" for i in range(100)]
+
+
+def test_detect_compression_requires_bz2_block_size(tmp_path):
+    path = tmp_path / "notes"
+    path.write_text("BZh is not a compressed file\n", encoding="utf8")
+    assert detect_compression(str(path)) is None
+    path.write_bytes(bz2.compress(b"text"))
+    assert detect_compression(str(path)) == "bz2"
@@ -0,0 +1,34 @@
+from xinaprocessor.helper import *
+import pytest
+
+
+def test_train_test_split_seeded():
+    x = list(range(100))
+    assert train_test_split(x[:], 0.2, random_seed=7) == train_test_split(x[:], 0.2, random_seed=7)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 42])
+def test_hash_split(seed):
+    keys = [f"سطر {i}" for i in range(10000)]
+    splits = [hash_split(key, [0.8, 0.1, 0.1], seed) for key in keys]
+    assert splits == [hash_split(key, [0.8, 0.1, 0.1], seed) for key in keys]
+    assert abs(splits.count(0) / len(keys) - 0.8) < 0.02
+    assert set(splits) == {0, 1, 2}
+
+
+def test_script_counts():
+    counts = script_counts("نصٌّ عربي hello 12 ۱ ! 😀")
+    assert counts == {"space": 6, "punctuation": 1, "digit": 3, "latin": 5, "emoji": 1, "persian": 0,
+                      "quranic": 0, "harakat": 2, "arabic": 6, "other": 0}
+    assert script_ratios(counts)["arabic"] == 6 / 18
+    assert script_counts("\ue000漢")["other"] == 2
+
+
+def test_fold_presentation_forms_matches_nfkc():
+    import unicodedata
+    for code in range(0xFB50, 0xFEFF):
+        text = "ب" + chr(code) + " ٔ"
+        assert normalize_unicode(text) == unicodedata.normalize("NFKC", text)
+    assert fold_presentation_forms("ﻷﺍﺑ") == "لأاب"
+    text = "نص عادي"
+    assert fold_presentation_forms(text) is text and normalize_unicode(text) is text
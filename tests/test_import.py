@@ -0,0 +1,32 @@
+import json
+import subprocess
+import sys
+import xinaprocessor
+
+# generous budget, the point is to catch heavy dependencies imported at startup again
+IMPORT_BUDGET_SECONDS = 1.0
+LAZY_MODULES = ["tqdm", "emoji", "statistics", "concurrent.futures", "asyncio", "multiprocessing", "orjson"]
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import xinaprocessor
+package_only = "xinaprocessor.cleaners" in sys.modules
+import xinaprocessor.cleaners
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "package_only": package_only,
+                  "loaded": [name for name in %r if name in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def test_import_time_and_lazy_dependencies():
+    output = subprocess.run([sys.executable, "-c", SCRIPT], capture_output=True, text=True, check=True).stdout
+    result = json.loads(output)
+    assert not result["package_only"]
+    assert result["loaded"] == []
+    assert result["seconds"] < IMPORT_BUDGET_SECONDS
+
+
+def test_lazy_package_attributes():
+    assert xinaprocessor.TextCleaner("نص http://x.com").remove_links().strip().text == "نص"
+    assert "FolderStreamCleaner" in dir(xinaprocessor)
@@ -0,0 +1,61 @@
+from xinaprocessor.index import LineIndex
+from xinaprocessor.cleaners import FileStreamCleaner, FileCleaner
+import os
+
+
+def test_line_index_build_reuse_and_grow(tmp_path):
+    filepath = tmp_path / "data.txt"
+    filepath.write_bytes(b"a\nbb\n\nccc")
+    cache_dir = str(tmp_path / "cache")
+    index = LineIndex(str(filepath), cache_dir=cache_dir, chunk_size=3)
+    assert list(index) == [(0, 1), (2, 4), (5, 5), (6, 9)]
+    assert sorted(os.listdir(tmp_path)) == ["cache", "data.txt"]
+    assert len(os.listdir(cache_dir)) == 1
+
+    reloaded = LineIndex(str(filepath), cache_dir=cache_dir)
+    assert list(reloaded.starts) == list(index.starts)
+
+    with open(filepath, "ab") as f:
+        f.write(b"d\nee\n")
+    assert list(reloaded.update()) == [(0, 1), (2, 4), (5, 5), (6, 10), (11, 13)]
+
+    filepath.write_bytes(b"x\ny")
+    assert list(reloaded.update()) == [(0, 1), (2, 3)]
+
+
+def test_file_stream_cleaner_random_access(tmp_path):
+    filepath = tmp_path / "data.txt"
+    filepath.write_text("\n".join(f"سطر {i}" for i in range(100)) + "\n", encoding="utf8")
+    cleaner = FileStreamCleaner(str(filepath), str(tmp_path / "cleaned.txt"))
+    assert len(cleaner) == 100
+    assert cleaner[42] == "سطر 42"
+    assert cleaner.head(2) == ["سطر 0", "سطر 1"]
+    assert cleaner.tail(2) == ["سطر 98", "سطر 99"]
+    assert cleaner.sample(5, seed=3) == cleaner.sample(5, seed=3)
+    assert len(set(cleaner.sample(100))) == 100
+    # the index stays in memory unless a directory is chosen
+    assert sorted(os.listdir(tmp_path)) == ["data.txt"]
+
+
+def test_lazy_file_cleaner_with_index(tmp_path):
+    filepath = tmp_path / "data.txt"
+    filepath.write_text("  \n" + "\n".join(f" سطر {i}" for i in range(30)) + "\n\n", encoding="utf8")
+    indexed = FileCleaner(str(filepath), lazy=True, index=True)
+    eager = FileCleaner(str(filepath))
+    assert len(indexed) == len(eager)
+    assert list(indexed.lines) == eager.lines
+    assert [indexed[i] for i in range(len(indexed))] == eager.lines
+
+
+def test_folder_cleaner_skips_sidecar_files(tmp_path):
+    from xinaprocessor.cleaners import FolderStreamCleaner
+    folder = tmp_path / "data"
+    folder.mkdir()
+    (folder / "x.txt").write_text("سطر http://x.com\n", encoding="utf8")
+    for name in ["x.txt.idx", "x.txt.ckpt", "x.txt.ckpt.tmp", "x.part00001.txt"]:
+        (folder / name).write_bytes(b"\x00\xff")
+    cleaner = FolderStreamCleaner(str(folder), str(tmp_path / "out"))
+    assert [os.path.basename(path) for path in cleaner.iter_files()] == ["x.txt"]
+    cleaner.apply.remove_links().strip()
+    cleaner.clean_files()
+    assert os.listdir(tmp_path / "out") == ["x.txt"]
@@ -0,0 +1,35 @@
+from xinaprocessor.shards import ShardedOutput
+from xinaprocessor.cleaners import FileStreamCleaner, FolderStreamCleaner
+import json
+import os
+
+
+def test_file_stream_clean_sharded(tmp_path):
+    filepath, savedir = tmp_path / "data.txt", tmp_path / "shards"
+    filepath.write_text("\n".join(f"سطر {i} http://x.com" for i in range(95)), encoding="utf8")
+    cleaner = FileStreamCleaner(str(filepath), str(tmp_path / "cleaned.txt"))
+    cleaner.remove_links().strip()
+    cleaner.clean_sharded(str(savedir), max_lines=10)
+    manifest = json.load(open(savedir / "manifest.json", encoding="utf8"))
+    assert [entry["path"] for entry in manifest["shards"]] == [f"part-{i:05d}.txt" for i in range(10)]
+    assert [entry["lines"] for entry in manifest["shards"]] == [10] * 9 + [5]
+    lines = []
+    for entry in manifest["shards"]:
+        text = (savedir / entry["path"]).read_text(encoding="utf8")
+        assert len(text.encode("utf8")) == entry["bytes"]
+        lines += text.splitlines()
+    assert lines == [f"سطر {i}" for i in range(95)]
+
+
+def test_folder_clean_files_sharded(tmp_path):
+    folder, savedir = tmp_path / "data", tmp_path / "shards"
+    folder.mkdir()
+    for i in range(4):
+        (folder / f"{i}.txt").write_text("\n".join(f"سطر {i} {j}" for j in range(50)), encoding="utf8")
+    cleaner = FolderStreamCleaner(str(folder), n_jobs=4)
+    cleaner.apply.strip()
+    manifest_path = cleaner.clean_files_sharded(str(savedir), max_bytes=200)
+    manifest = json.load(open(manifest_path, encoding="utf8"))
+    assert manifest["lines"] == 200
+    assert len(manifest["shards"]) == len(os.listdir(savedir)) - 1
+    assert all(entry["bytes"] < 220 for entry in manifest["shards"])
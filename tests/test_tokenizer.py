@@ -0,0 +1,21 @@
+from xinaprocessor.tokenizer import *
+from xinaprocessor.cleaners import TextCleaner
+
+
+def test_spans_and_helpers():
+    text = "والكتاب، 12.5 kg وزير 🙂🙂"
+    tokenizer = Tokenizer(split_conjunctions=True)
+    spans = tokenizer.spans(text)
+    assert list(iter_tokens(text, spans)) == ["و", "الكتاب", "،", "12.5", "kg", "وزير", "🙂🙂"]
+    assert count_tokens(spans) == 7
+    assert list(token_lengths(spans)) == [1, 6, 1, 4, 2, 4, 2]
+    assert has_token_of_length(spans, 1) and not has_token_of_length(spans, 3)
+    assert list(iter_tokens(text, Tokenizer().spans(text)))[:2] == ["والكتاب", "،"]
+
+
+def test_spans_batch():
+    lines = ["ذهب الولد", "", "the boy, went"]
+    spans, line_starts = Tokenizer().spans_batch(lines)
+    assert list(line_starts) == [0, 2, 2, 6]
+    assert list(iter_tokens(lines[2], line_spans(spans, line_starts, 2))) == ["the", "boy", ",", "went"]
+    assert TextCleaner("\n".join(lines + ["الولد"])).get_token_frequency()["الولد"] == 2
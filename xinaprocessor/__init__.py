@@ -0,0 +1,53 @@
+"""Arabic text cleaning and processing.
+
+The cleaners are imported on first access, so `import xinaprocessor` stays cheap for short-lived
+processes that only use part of the library.
+
+Examples:
+    >>> import xinaprocessor
+    >>> xinaprocessor.TextCleaner("نص http://x.com").remove_links().strip().text
+"""
+import importlib
+from typing import TYPE_CHECKING
+
+_LAZY_ATTRIBUTES = {
+    "AsyncCleaner": "xinaprocessor.cleaners",
+    "BaseCleaner": "xinaprocessor.base",
+    "TextCleaner": "xinaprocessor.cleaners",
+    "FileCleaner": "xinaprocessor.cleaners",
+    "FileStreamCleaner": "xinaprocessor.cleaners",
+    "JsonlStreamCleaner": "xinaprocessor.cleaners",
+    "FolderStreamCleaner": "xinaprocessor.cleaners",
+    "CompactLines": "xinaprocessor.classes",
+    "LineCache": "xinaprocessor.classes",
+    "MappedLines": "xinaprocessor.classes",
+    "Sequential": "xinaprocessor.classes",
+    "LineIndex": "xinaprocessor.index",
+    "ShardedOutput": "xinaprocessor.shards",
+    "Tokenizer": "xinaprocessor.tokenizer",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+if TYPE_CHECKING:
+    from xinaprocessor.base import BaseCleaner
+    from xinaprocessor.classes import CompactLines, LineCache, MappedLines, Sequential
+    from xinaprocessor.cleaners import (AsyncCleaner, FileCleaner, FileStreamCleaner, FolderStreamCleaner,
+                                        JsonlStreamCleaner, TextCleaner)
+    from xinaprocessor.index import LineIndex
+    from xinaprocessor.shards import ShardedOutput
+    from xinaprocessor.tokenizer import Tokenizer
+
+
+def __getattr__(name):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    # later accesses do not go through __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,4 @@
+import sys
+from xinaprocessor.cli import main
+
+sys.exit(main())
@@ -1,12 +1,17 @@
 from xinaprocessor.constants import *
 from xinaprocessor.helper import *
 from typing import List
-from xinaprocessor.classes import Sequential
+from xinaprocessor.classes import Sequential, CompactLines, MappedLines, LineCache, PendingLines, function_fingerprint
 from functools import partial, reduce
+from itertools import chain
 import operator
 from xinaprocessor.decorators import show_empty_warning
 
 
+# types that can hold the lines of a cleaner
+LINE_STORES = (list, CompactLines, MappedLines, PendingLines)
+
+
 @show_empty_warning
 class BaseCleaner:
     """Base class for all cleaners, it contains all basic functionality of the cleaner
@@ -14,13 +19,23 @@ class BaseCleaner:
     Args:
         lines (List[str]): list of strings, text to be processed
         stream (bool): whether to use streaming or not
+        compact (bool): whether to store lines in a contiguous buffer (CompactLines) to save memory
     """
 
-    def __init__(self, lines: List[str] = [], stream=False) -> None:
-        self.lines = lines
+    def __init__(self, lines: List[str] = None, stream=False, compact=False) -> None:
         self.stream = stream
+        self.compact = compact
+        self.lines = self._new_lines(lines if lines is not None else [])
         # used for streaming
         self._sequential = Sequential()
+        # joined execution of the batch-safe maps, see set_batch_join
+        self.batch_join = False
+        self.batch_size = 10000
+        # memoization of per-line results, see set_line_cache
+        self.line_cache = None
+        # process-parallel execution of the maps and filters, see set_workers
+        self.n_workers = 1
+        self.parallel_min_lines = 100000
 
     # region remove functions
     def remove_english_text(self):
@@ -94,22 +109,23 @@ class BaseCleaner:
         Args:
             keep_space (int, optional): number of maximum spaces to keep. Defaults to 1.
         """
-        return self._map_lines(lambda line: remove_extra_spaces(line, keep_space))
+        fn = lambda line: remove_extra_spaces(line, keep_space)
+        return self._map_lines(fn, fn)
 
     def remove_emojis(self):
         """Removes all emojis using emojis library
         """
-        return self._map_lines(remove_emoji)
+        return self._map_lines(remove_emoji, remove_emoji)
 
     def remove_hashtags(self):
         """Removes all hashtags from text
         """
-        return self._map_lines(remove_hashtags)
+        return self._map_lines(remove_hashtags, remove_hashtags_joined)
 
     def remove_emails(self):
         """Removes all emails address from text
         """
-        return self._map_lines(remove_emails)
+        return self._map_lines(remove_emails, remove_emails)
 
     def remove_quranic_annotations(self):
         """Removes all quranic annotations from text
@@ -124,34 +140,94 @@ class BaseCleaner:
     def remove_links(self):
         """Removes all links from text
         """
-        return self._map_lines(remove_links)
+        return self._map_lines(remove_links, remove_links)
 
     def remove_mentions(self):
         """Removes all mentions from text
         """
-        return self._map_lines(remove_mentions)
+        return self._map_lines(remove_mentions, remove_mentions_joined)
 
     # endregion
     # region internal functions
 
-    def _filter_lines(self, fn):
-        return self._filter_map(self.lines, fn)
+    @property
+    def lines(self):
+        # the maps and filters waiting to run in worker processes run on first access
+        if isinstance(self._lines, PendingLines):
+            self._lines = self._lines.materialize()
+        return self._lines
+
+    @lines.setter
+    def lines(self, lines):
+        self._lines = lines
+
+    @property
+    def _has_pending_lines(self):
+        return isinstance(self._lines, PendingLines)
+
+    def _filter_lines(self, fn, pure=True):
+        """Keep the lines for which fn is true. pure is False when fn has side effects, e.g. a report."""
+        return self._filter_map(self._lines, fn, pure)
 
-    def _filter_map(self, inp_list, fn):
-        assert isinstance(inp_list, list)
+    def _filter_map(self, inp_list, fn, pure=True):
+        assert isinstance(inp_list, LINE_STORES)
         fnc = partial(filter, fn)
-        return self._apply(inp_list, fnc)
+        fingerprint = self._cache_fingerprint(fn) if pure and not self.stream else None
+        if fingerprint is not None:
+            keep = self.line_cache.map(fingerprint, fn, inp_list)
+            self.lines = self._new_lines(line for line, kept in zip(inp_list, keep) if kept)
+            return self
+        return self._apply(inp_list, fnc, "filter", fn, pure)
+
+    def _cache_fingerprint(self, fn):
+        """Fingerprint of fn in the line cache, None if there is no cache or fn cannot be told apart."""
+        if self.line_cache is None:
+            return None
+        try:
+            return function_fingerprint(fn, strict=True)
+        except ValueError:
+            return None
 
     def _apply_on_lines(self, fnc):
         return self._apply(self.lines, fnc)
 
-    def _apply(self, inp_list, fnc):
+    def _apply(self, inp_list, fnc, kind=None, fn=None, pure=True):
         if self.stream:
-            self._sequential.add(fnc)
+            self._sequential.add(fnc, kind, fn, pure=pure)
+        elif kind in ("map", "filter"):
+            self.lines = self._run_local(fnc, inp_list, pure)
         else:
-            self.lines = list(fnc(inp_list))
+            self.lines = self._new_lines(fnc(inp_list))
         return self
 
+    def _run_local(self, fnc, lines, pure=True):
+        """Run a line-local operation, on partitions in worker processes when n_workers > 1.
+
+        Consecutive operations are chained in PendingLines and run together when the lines are
+        accessed. Operations with side effects, e.g. reports, run in this process.
+        """
+        if self.n_workers > 1 and pure:
+            if isinstance(lines, PendingLines):
+                return lines.then(fnc)
+            if len(lines) >= self.parallel_min_lines:
+                from xinaprocessor.parallel import can_fork
+                if can_fork():
+                    return PendingLines(lines, [fnc], self.n_workers, self._new_lines)
+        return self._new_lines(fnc(lines))
+
+    def _new_lines(self, items):
+        """Materialize the result of an operation as a list, or as CompactLines in compact mode."""
+        if not self.compact:
+            return list(items)
+        items = iter(items)
+        first = next(items, None)
+        if first is None:
+            return CompactLines()
+        # intermediate results such as split lines are kept in a list until they are flattened
+        if not isinstance(first, str):
+            return [first, *items]
+        return CompactLines(chain([first], items))
+
     def _keep_only(self, to_keep, remove_tashkeel=True, remove_tatweel=True):
         self.lines = self._get(
             to_keep, remove_tashkeel=remove_tashkeel, remove_tatweel=remove_tatweel,
@@ -165,35 +241,44 @@ class BaseCleaner:
             self.remove_tashkeel()
         if remove_tatweel:
             self.remove_tatweel()
-        return self._mapper(self.lines, lambda line: keep_only(line, to_keep))
+        return self._mapper(self._lines, lambda line: keep_only(line, to_keep))
 
-    def _map(self, inp_list, fn):
-        self.lines = self._mapper(inp_list, fn)
+    def _map(self, inp_list, fn, batch_fn=None):
+        self.lines = self._mapper(inp_list, fn, batch_fn)
         return self
 
-    def _map_lines(self, fn):
-        return self._map(self.lines, fn)
+    def _map_lines(self, fn, batch_fn=None):
+        """Map fn on each line. batch_fn, if given, has the same effect on lines joined by BATCH_SENTINEL."""
+        return self._map(self._lines, fn, batch_fn)
 
-    def _mapper(self, list_map, fn):
-        assert isinstance(list_map, list)
+    def _mapper(self, list_map, fn, batch_fn=None):
+        assert isinstance(list_map, LINE_STORES)
         fnc = partial(map, fn)
         if self.stream:
-            self._sequential.add(fnc)
+            self._sequential.add(fnc, "map", fn, batch_fn)
             return self.lines
-        else:
-            return list(fnc(list_map))
+        fingerprint = self._cache_fingerprint(fn)
+        if fingerprint is not None:
+            return self._new_lines(self.line_cache.map(fingerprint, fn, list_map))
+        if self.batch_join and batch_fn is not None:
+            fnc = partial(map_joined_batches, fn, batch_fn, self.batch_size)
+        return self._run_local(fnc, list_map)
 
     def _remove(self, remove):
         assert remove is not None
         if not isinstance(remove, list):
             remove = list(remove)
-        return self._map_lines(lambda line: replace_list(remove, line))
+        fn = lambda line: replace_list(remove, line)
+        # removing the sentinel itself would merge the joined lines
+        return self._map_lines(fn, None if BATCH_SENTINEL in remove else fn)
 
     def _replace(self, replace, rep_with):
         assert replace is not None
         if not isinstance(replace, list):
             replace = list(replace)
-        return self._map_lines(lambda line: replace_list(replace, line, rep_with))
+        fn = lambda line: replace_list(replace, line, rep_with)
+        safe = BATCH_SENTINEL not in replace and BATCH_SENTINEL not in rep_with
+        return self._map_lines(fn, fn if safe else None)
 
     def _join_text(self, lines, sep):
         return sep.join(lines).strip() if sep else lines[0]
@@ -209,6 +294,20 @@ class BaseCleaner:
                                          if indices is None or i in indices])
         fnc2 = partial(reduce, operator.iconcat)
         return self._apply_on_lines(fnc)._apply_on_lines(fnc2)
+
+    def _script_limits(self, bounds):
+        """Parse bounds like {"arabic_min": 0.8} into (name, script, is_min, value) tuples.
+
+        Raises:
+            ValueError: If a name is not <class>_min or <class>_max.
+        """
+        limits = []
+        for name, value in bounds.items():
+            script, _, bound = name.rpartition("_")
+            if script not in SCRIPT_CLASSES or script == "space" or bound not in ("min", "max"):
+                raise ValueError(f"Unknown bound {name}, use <class>_min or <class>_max.")
+            limits.append((name, script, bound == "min", value))
+        return limits
     # endregion
     # region filter functions
 
@@ -316,6 +415,104 @@ class BaseCleaner:
             lambda line: not contains_english(line))
         return self._filter_lines(filter_fn)
 
+    def drop_lines_by_script_ratio(self, **bounds):
+        """Drop lines whose ratio of characters of a script class is out of bounds.
+
+        All ratios of a line are computed in one table-driven pass, over all characters except spaces.
+        Script classes are: other, punctuation, digit, latin, emoji, persian, quranic, harakat and arabic.
+
+        Args:
+            **bounds: "<class>_min" and "<class>_max" ratios, e.g. arabic_min=0.8, latin_max=0.1
+
+        Raises:
+            ValueError: If a bound does not match a script class.
+
+        Examples:
+            >>> cleaner.drop_lines_by_script_ratio(arabic_min=0.8, emoji_max=0)
+        """
+        limits = self._script_limits(bounds)
+
+        def filter_fn(line):
+            ratios = script_ratios(script_counts(line))
+            return all(ratios[script] >= value if is_min else ratios[script] <= value
+                       for _, script, is_min, value in limits)
+        return self._filter_lines(filter_fn)
+
+    def quality_filter(self, min_words: int = None, max_words: int = None, min_chars: int = None,
+                       max_chars: int = None, single_char=False, repeated_chars: int = None,
+                       min_symbol_count: dict = None, max_symbol_count: dict = None,
+                       max_punctuation_ratio: float = None, script_bounds: dict = None, report: list = None):
+        """Drop low quality lines by applying several thresholds in a single pass.
+
+        The features of each line (words, length, symbol counts, script ratios) are computed once and
+        only when a threshold needs them, instead of rescanning the line in one filter per threshold.
+
+        Args:
+            min_words (int, optional): drop lines with less words. Defaults to None.
+            max_words (int, optional): drop lines with more words. Defaults to None.
+            min_chars (int, optional): drop lines with less characters. Defaults to None.
+            max_chars (int, optional): drop lines with more characters. Defaults to None.
+            single_char (bool, optional): True to drop lines containing a single character word. Defaults to False.
+            repeated_chars (int, optional): drop lines with this number of consecutively repeated characters.
+                Defaults to None.
+            min_symbol_count (dict, optional): {symbol: count} drop lines with a lower count. Defaults to None.
+            max_symbol_count (dict, optional): {symbol: count} drop lines with a higher count. Defaults to None.
+            max_punctuation_ratio (float, optional): drop lines with a higher ratio of punctuations
+                over non space characters. Defaults to None.
+            script_bounds (dict, optional): script ratio bounds, see drop_lines_by_script_ratio,
+                e.g. {"arabic_min": 0.8}. Defaults to None.
+            report (list, optional): if given, (line, reasons) is appended to it for each dropped line,
+                where reasons are the names of the failed thresholds. Defaults to None.
+
+        Examples:
+            >>> dropped = []
+            >>> cleaner.quality_filter(min_words=3, repeated_chars=4, script_bounds={"arabic_min": 0.8},
+            ...                        report=dropped)
+        """
+        min_symbol_count = min_symbol_count or {}
+        max_symbol_count = max_symbol_count or {}
+        script_limits = self._script_limits(script_bounds or {})
+        need_words = min_words is not None or max_words is not None or single_char
+        need_scripts = max_punctuation_ratio is not None or bool(script_limits)
+
+        def failures(line):
+            if need_words:
+                words = line.split()
+                if min_words is not None and len(words) < min_words:
+                    yield "min_words"
+                if max_words is not None and len(words) > max_words:
+                    yield "max_words"
+                if single_char and any(len(word) == 1 and (word.isalnum() or word == "_") for word in words):
+                    yield "single_char"
+            if min_chars is not None and len(line) < min_chars:
+                yield "min_chars"
+            if max_chars is not None and len(line) > max_chars:
+                yield "max_chars"
+            for symbol, count in min_symbol_count.items():
+                if line.count(symbol) < count:
+                    yield f"min_symbol_count:{symbol}"
+            for symbol, count in max_symbol_count.items():
+                if line.count(symbol) > count:
+                    yield f"max_symbol_count:{symbol}"
+            if repeated_chars is not None and contains_repeated_chars(line, repeated_chars):
+                yield "repeated_chars"
+            if need_scripts:
+                ratios = script_ratios(script_counts(line))
+                if max_punctuation_ratio is not None and ratios["punctuation"] > max_punctuation_ratio:
+                    yield "max_punctuation_ratio"
+                for name, script, is_min, value in script_limits:
+                    if (ratios[script] < value) if is_min else (ratios[script] > value):
+                        yield name
+
+        def filter_fn(line):
+            if report is None:
+                return next(failures(line), None) is None
+            reasons = list(failures(line))
+            if reasons:
+                report.append((line, reasons))
+            return not reasons
+        return self._filter_lines(filter_fn, pure=report is None)
+
     def keep_lines_contain(self, input_string: int):
         """Keep only all lines contain a certain string
 
@@ -330,7 +527,7 @@ class BaseCleaner:
     def clear_text(self):
         """Clear text. Text should be added before you can clean again.
         """
-        self.lines = []
+        self.lines = self._new_lines([])
         return self
 
     def clear_sequential(self):
@@ -339,6 +536,82 @@ class BaseCleaner:
         if self.stream:
             self._sequential.clear()
 
+    def set_adaptive_filters(self, enabled=True, reorder_every=10):
+        """Let streaming reorder consecutive filters by their observed cost and pass rate.
+
+        Results are identical, since filters applied to the same line commute. Only applies when
+        streaming, where operations run batch by batch.
+
+        Args:
+            enabled (bool, optional): True to enable adaptive reordering. Defaults to True.
+            reorder_every (int, optional): number of batches between two reorderings. Defaults to 10.
+        """
+        self._sequential.set_adaptive(enabled, reorder_every)
+        return self
+
+    def set_batch_join(self, enabled=True, batch_size=10000):
+        """Run the regex based maps once over a joined batch of lines instead of once per line.
+
+        Lines are joined with a sentinel character, and the operations that are safe across it
+        (links, hashtags, mentions, emails, emojis, repeated characters, extra spaces and character
+        removals) run as one call per batch. Results are identical. Applies to the operations called
+        after it in memory, and to all batches when streaming.
+
+        Args:
+            enabled (bool, optional): True to enable joined execution. Defaults to True.
+            batch_size (int, optional): number of lines joined at once in memory. Defaults to 10000.
+        """
+        self.batch_join = enabled
+        self.batch_size = batch_size
+        self._sequential.set_batch_join(enabled)
+        return self
+
+    def set_workers(self, n_workers: int, min_lines=100000):
+        """Run the following maps and filters in n_workers processes, on contiguous partitions of the lines.
+
+        Partitions are exchanged with the workers as packed buffers in shared memory. Consecutive
+        maps and filters are chained and run in a single pool when the lines are next accessed, so
+        the lines are packed and unpacked once per chain. Workers are forked, so operations are not
+        pickled, and it falls back to a single process on platforms that cannot fork. Operations
+        that change the number of lines (e.g. splits), cached operations and operations with side
+        effects (e.g. quality_filter with a report) stay in the main process.
+
+        Args:
+            n_workers (int): number of worker processes, 1 to disable.
+            min_lines (int, optional): minimum number of lines to use the workers. Defaults to 100000.
+        """
+        assert n_workers > 0, "n_workers should be greater than 0"
+        self.n_workers = n_workers
+        self.parallel_min_lines = min_lines
+        return self
+
+    def set_line_cache(self, max_entries=1000000, max_bytes=None, cache: LineCache = None):
+        """Memoize per-line results, so repeated lines (retweets, boilerplate) are cleaned once.
+
+        In memory, each map or filter looks up its result by its fingerprint and the line. When
+        streaming, the leading maps and filters of the pipeline are looked up at once by the
+        pipeline fingerprint and the raw line. The cache statistics are in `line_cache.stats()`.
+
+        Args:
+            max_entries (int, optional): maximum number of cached lines. Defaults to 1000000.
+            max_bytes (int, optional): maximum approximate memory of the cache. Defaults to None.
+            cache (LineCache, optional): existing cache to share with other cleaners. Defaults to None.
+
+        Examples:
+            >>> cleaner = TextCleaner(text).set_line_cache(max_entries=100000)
+            >>> cleaner.remove_links().drop_empty_lines().line_cache.hit_rate
+        """
+        self.line_cache = cache if cache is not None else LineCache(max_entries, max_bytes)
+        self._sequential.set_cache(self.line_cache)
+        return self
+
+    def clear_line_cache(self):
+        """Disable the per-line cache.
+        """
+        self.line_cache = None
+        self._sequential.set_cache(None)
+        return self
+
     def split_lines_on(self, symbol: str):
         """Further split each line by the input "symbol".
         Number of lines will increase by the number of splits applied.
@@ -346,7 +619,8 @@ class BaseCleaner:
         Args:
             symbol (str): Symbol to split on
         """
-        return self._map_lines(lambda line: line.split(symbol))._flatten_list()
+        # splits are not line-local, they change the number of lines
+        return self._apply_on_lines(partial(map, lambda line: line.split(symbol)))._flatten_list()
 
     def split_and_remove_lines_on(self, symbol: str, columns: List[int]):
         """Further split each line by the input "symbol" and keeps only (columns) indices
@@ -355,7 +629,7 @@ class BaseCleaner:
             symbol (str): Symbol to split on
             columns (List[int]): columns to keep after splitting.
         """
-        return self._map_lines(lambda line: line.split(symbol))._flatten_list(columns)
+        return self._apply_on_lines(partial(map, lambda line: line.split(symbol)))._flatten_list(columns)
 
     def add_text(self, text: str, sep: str = None):
         """Add more text to be processed
@@ -365,7 +639,7 @@ class BaseCleaner:
             sep (str, optional): separator to split text if needed. Defaults to None.
         """
         new_lines = [text] if not sep else text.split(sep)
-        self.lines.extend(new_lines)
+        self._mutable_lines().extend(new_lines)
         return self
 
     def set_text(self, text: str, sep: str = None):
@@ -378,7 +652,7 @@ class BaseCleaner:
         if not text:
             return self
         text = text.strip()
-        self.lines = [text] if not sep else text.split(sep)
+        self.lines = self._new_lines([text] if not sep else text.split(sep))
         return self.strip()
 
     def connect_single_char(self, with_prev=False):
@@ -402,7 +676,8 @@ class BaseCleaner:
             keep_char (int, optional): number of characters to keep. Defaults to 1.
         """
         return self._map_lines(
-            lambda line: replace_repeated_chars(line, repeated, keep_char)
+            lambda line: replace_repeated_chars(line, repeated, keep_char),
+            lambda text: replace_repeated_chars_joined(text, repeated, keep_char),
         )
 
     def replace_except(self, keep_symbols: str, replace_by: str):
@@ -413,7 +688,8 @@ class BaseCleaner:
     def convert_arabic_numbers_to_english(self):
         """Convert arabic numbers to english numbers.
         """
-        return self._map_lines(lambda line: multi_replace(ARABIC_NUM, ENGLISH_NUM, line))
+        fn = lambda line: multi_replace(ARABIC_NUM, ENGLISH_NUM, line)
+        return self._map_lines(fn, fn)
 
     def strip(self):
         """Strip left and right spaces from all lines in text.
@@ -475,7 +751,7 @@ class BaseCleaner:
     def swap_tanween_alef(self):
         """swap the tanween alef pattern by alef then tanween 
         """
-        return self._map_lines(swap_tanween_alef)
+        return self._map_lines(swap_tanween_alef, swap_tanween_alef)
 
     # endregion
 
@@ -489,22 +765,64 @@ class BaseCleaner:
         """
         return self.lines
 
+    def clean_iter(self, iterable, batch_size=1000):
+        """Lazily clean any iterable of lines, e.g. a generator, a database cursor or a queue consumer.
+
+        The operations recorded in stream mode are applied batch by batch, so at most batch_size
+        input lines are held in memory, and nothing is written to disk.
+
+        Args:
+            iterable (Iterable[str]): lines to clean.
+            batch_size (int, optional): number of lines cleaned at once. Defaults to 1000.
+
+        Raises:
+            ValueError: If the cleaner is not in stream mode or has no operations.
+
+        Returns:
+            Iterator[str]: cleaned lines, in order.
+
+        Examples:
+            >>> cleaner = BaseCleaner(stream=True).strip().remove_links().drop_empty_lines()
+            >>> for line in cleaner.clean_iter(row[0] for row in cursor):
+            ...     print(line)
+        """
+        if not self.stream:
+            raise ValueError("clean_iter requires a cleaner created with stream=True.")
+        if len(self._sequential) == 0:
+            raise ValueError("Make sure to call the functions you want before start cleaning.")
+        # validated here, not on the first next() of the generator
+        return self._clean_batches(iterable, batch_size)
+
+    def _clean_batches(self, iterable, batch_size):
+        for batch in iter_batches(iterable, batch_size):
+            yield from self._sequential.apply(batch)
+
     # endregion
     # region object operations
     def __getitem__(self, item):
-        if item < 0 or item >= len(self):
+        if item < 0:
             raise IndexError
+        # the line stores raise IndexError, lazy ones without counting the lines
         return self.lines[item]
 
     def __len__(self):
         return len(self.lines)
 
+    def __iter__(self):
+        return iter(self.lines)
+
     def __iadd__(self, other):
-        self.lines += other.lines
+        self._mutable_lines().extend(other.lines)
         return self
 
+    def _mutable_lines(self):
+        """Return the lines, first read into memory if they are a read only MappedLines."""
+        if isinstance(self.lines, MappedLines):
+            self.lines = self._new_lines(self.lines)
+        return self.lines
+
     def __neg__(self):
-        self.lines = self.lines[::-1]
+        self.lines = self._new_lines(self.lines[::-1])
         return self
 
     # endregion
@@ -515,6 +833,25 @@ class BaseCleaner:
         """
         return self._replace(LAM_ALEF_COMBINED, LAM_ALEF_NORMAL)
 
+    def fold_presentation_forms(self):
+        """Convert Arabic presentation forms (U+FB50 to U+FEFE), common in text extracted from PDF,
+        to the normal characters, as NFKC does, e.g. "\ufef7" to "\u0644\u0623".
+        """
+        return self._map_lines(fold_presentation_forms, fold_presentation_forms)
+
+    def normalize_unicode(self, form="NFKC"):
+        """Normalize the text to a unicode normal form.
+
+        Presentation forms are folded with a precomputed table, and lines that are already
+        normalized are kept as they are.
+
+        Args:
+            form (str, optional): one of "NFC", "NFD", "NFKC" and "NFKD". Defaults to "NFKC".
+        """
+        assert form in ("NFC", "NFD", "NFKC", "NFKD"), "form should be one of NFC, NFD, NFKC and NFKD"
+        fn = lambda line: normalize_unicode(line, form)
+        return self._map_lines(fn, fn)
+
     def normalize_hamza(self):
         """Convert all hamza variations to the normal hamza
         """
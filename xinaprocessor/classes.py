@@ -1,27 +1,353 @@
-from typing import Callable, Iterable, Any, NamedTuple
+import mmap
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+from functools import partial
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from collections.abc import Sequence
+from itertools import accumulate, chain, islice
+from types import ModuleType
+from typing import Callable, Iterable, Any, NamedTuple, Tuple
+from xinaprocessor.helper import map_joined
+from xinaprocessor.index import LineIndex
 
 
 class Operation(NamedTuple):
     fnc: Callable[[Any], Any]
+    # "map" or "filter" when the operation applies `fn` to each line independently
+    kind: str = None
+    fn: Callable[[str], Any] = None
+    # function with the same effect as `fn` on lines joined by BATCH_SENTINEL, None if it is not safe
+    batch_fn: Callable[[str], str] = None
+    # False when `fn` has side effects (e.g. a report of the dropped lines), so it is never cached
+    pure: bool = True
+
+
+class FilterStats:
+    """Observed cost and selectivity of a filter operation."""
+
+    def __init__(self):
+        self.seen = 0
+        self.passed = 0
+        self.seconds = 0.0
+
+    @property
+    def rank(self):
+        # expected cost of a line divided by the probability of dropping it, lower runs first
+        if self.seen == 0:
+            return 0.0
+        dropped = 1 - self.passed / self.seen
+        return self.seconds / self.seen / dropped if dropped else float("inf")
+
+
+_MISSING = object()
+
+
+class LineCache:
+    """Bounded LRU cache of per-line results, keyed by a pipeline fingerprint and the raw line.
+
+    Corpora repeat the same lines (retweets, boilerplate), so the result of a line-local
+    pipeline is computed once per distinct line while it stays in the cache.
+
+    Args:
+        max_entries (int, optional): maximum number of cached lines. Defaults to 1000000.
+        max_bytes (int, optional): maximum approximate memory of the cached lines and results.
+            Defaults to None.
+
+    Examples:
+        >>> cache = LineCache(max_entries=1000)
+        >>> cache.map("pipeline", str.strip, [" a ", " a "])
+        ['a', 'a']
+        >>> cache.hit_rate
+        0.5
+    """
+
+    def __init__(self, max_entries: int = 1000000, max_bytes: int = None):
+        assert max_entries or max_bytes, "max_entries or max_bytes must be specified"
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        # one cached pipeline can be applied from several threads, e.g. by aclean_files
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value):
+        size = sys.getsizeof(key[-1]) + sys.getsizeof(value)
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous[1]
+            self._data[key] = (value, size)
+            self.nbytes += size
+            while (self.max_entries and len(self._data) > self.max_entries) or \
+                    (self.max_bytes and self.nbytes > self.max_bytes and len(self._data) > 1):
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.nbytes -= evicted
+                self.evictions += 1
+
+    def map(self, fingerprint: str, fn: Callable[[str], Any], lines: Iterable[str]):
+        """Apply fn on each line, reusing the cached result of the lines already seen.
+
+        Args:
+            fingerprint (str): identifier of fn, part of the key.
+            fn (Callable[[str], Any]): function applied on the lines missing from the cache.
+            lines (Iterable[str]): raw lines.
+
+        Returns:
+            List[Any]: result of fn for each line.
+        """
+        results = []
+        for line in lines:
+            key = (fingerprint, line)
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                value = fn(line)
+                self.put(key, value)
+            results.append(value)
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """Return the number of hits, misses, evictions, entries and bytes, and the hit rate."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self._data), "bytes": self.nbytes, "hit_rate": self.hit_rate}
+
+    def __len__(self):
+        return len(self._data)
 
 
 class Sequential:
     def __init__(self):
         super().__init__()
         self.operations = []
+        # adaptive reordering of consecutive filters, see set_adaptive
+        self.adaptive = False
+        self.reorder_every = 10
+        self._stats = {}
+        self._orders = {}
+        self._n_batches = 0
+        # joined execution of consecutive batch-safe maps, see set_batch_join
+        self.batch_join = False
+        # memoization of the leading line-local operations, see set_cache
+        self.cache = None
+        self._fingerprints = {}
+        self._n_cacheable = None
+
+    def set_cache(self, cache: "LineCache"):
+        """Memoize the result of the leading maps and filters for each distinct raw line.
+
+        Args:
+            cache (LineCache): cache to use, possibly shared with other pipelines, or None to disable it.
+        """
+        self.cache = cache
+
+    def set_batch_join(self, enabled=True):
+        """Run consecutive maps that are safe across the sentinel once over the joined batch.
+
+        The lines of a batch are joined with BATCH_SENTINEL, so a regex based operation is a single
+        call per batch instead of one call per line. The output is unchanged.
+
+        Args:
+            enabled (bool, optional): True to enable joined execution. Defaults to True.
+        """
+        self.batch_join = enabled
 
-    def add(self, fnc: Callable[[Any], Any]):
-        operation = Operation(fnc)
+    def set_adaptive(self, enabled=True, reorder_every=10):
+        """Reorder runs of consecutive filters by their observed cost and pass rate.
+
+        Filters applied to the same line commute, so the output is unchanged. Filters with side
+        effects (e.g. a report of the dropped lines) are never moved and split the runs. Each run
+        starts in the order of the calls, and is reordered every `reorder_every` batches so that
+        cheap filters that drop many lines run first.
+
+        Args:
+            enabled (bool, optional): True to enable adaptive reordering. Defaults to True.
+            reorder_every (int, optional): number of batches between two reorderings. Defaults to 10.
+        """
+        self.adaptive = enabled
+        self.reorder_every = reorder_every
+        self._stats, self._orders, self._n_batches = {}, {}, 0
+
+    def _run_kind(self, op: Operation):
+        if self.adaptive and op.kind == "filter" and op.pure:
+            return "filter"
+        if self.batch_join and op.kind == "map" and op.batch_fn is not None:
+            return "joined"
+        return None
+
+    def _runs(self):
+        """Split operation indices into runs of consecutive filters (adaptive mode), runs of
+        consecutive batch-safe maps (joined mode) and single other operations."""
+        runs, previous = [], None
+        for i, op in enumerate(self.operations):
+            kind = self._run_kind(op)
+            if kind is not None and kind == previous:
+                runs[-1].append(i)
+            else:
+                runs.append([i])
+            previous = kind
+        return runs
+
+    def _apply_filters(self, run, lines):
+        key = tuple(run)
+        order = self._orders.get(key, run)
+        for i in order:
+            stats = self._stats.setdefault(i, FilterStats())
+            fn = self.operations[i].fn
+            start = time.perf_counter()
+            passed = [line for line in lines if fn(line)]
+            stats.seconds += time.perf_counter() - start
+            stats.seen += len(lines)
+            stats.passed += len(passed)
+            lines = passed
+        if self._n_batches % self.reorder_every == 0:
+            self._orders[key] = sorted(run, key=lambda i: self._stats[i].rank)
+        return lines
+
+    def add(self, fnc: Callable[[Any], Any], kind: str = None, fn: Callable[[str], Any] = None,
+            batch_fn: Callable[[str], str] = None, pure=True):
+        operation = Operation(fnc, kind, fn, batch_fn, pure)
         self.operations.append(operation)
+        self._fingerprints = {}
+        self._n_cacheable = None
+
+    def _n_local(self):
+        """Number of leading operations that can be cached: pure maps and filters with a stable fingerprint."""
+        if self._n_cacheable is None:
+            self._n_cacheable = len(self.operations)
+            for i, op in enumerate(self.operations):
+                if op.kind not in ("map", "filter") or not op.pure or not is_describable(op.fnc):
+                    self._n_cacheable = i
+                    break
+        return self._n_cacheable
+
+    def _apply_cached(self, lines, n_local):
+        fingerprint = self._fingerprints.get(n_local)
+        if fingerprint is None:
+            fingerprint = self._fingerprints[n_local] = self.fingerprint(n_local)
+        cache, missing = self.cache, {}
+        results = [cache.get((fingerprint, line), _MISSING) for line in lines]
+        for line, result in zip(lines, results):
+            if result is _MISSING:
+                missing[line] = None
+        if missing:
+            # the distinct missing lines run together, None marks a line dropped by a filter
+            for line, result in self._apply_local(((line, line) for line in missing),
+                                                  self.operations[:n_local]):
+                missing[line] = result
+            for line, result in missing.items():
+                cache.put((fingerprint, line), result)
+            results = [missing[line] if result is _MISSING else result
+                       for line, result in zip(lines, results)]
+        return [result for result in results if result is not None]
 
     def apply(self, lst: Iterable[str]):
         output = lst
-        for op in self.operations:
-            output = list(op.fnc(output))
+        start = 0
+        if self.cache is not None:
+            start = self._n_local()
+            if start:
+                output = self._apply_cached(list(output), start)
+        if not (self.adaptive or self.batch_join):
+            for op in self.operations[start:]:
+                output = list(op.fnc(output))
+            return output
+        if self.adaptive:
+            self._n_batches += 1
+        for run in self._runs():
+            # the cached prefix may end inside a run
+            run = [i for i in run if i >= start]
+            if not run:
+                continue
+            kind = self._run_kind(self.operations[run[0]])
+            if kind == "filter" and len(run) > 1:
+                output = self._apply_filters(run, list(output))
+            elif kind == "joined":
+                ops = [self.operations[i] for i in run]
+                output = map_joined(list(output), [op.fn for op in ops], [op.batch_fn for op in ops])
+            else:
+                for i in run:
+                    output = list(self.operations[i].fnc(output))
+        return output
+
+    def apply_keyed(self, pairs: Iterable[Tuple[Any, str]]):
+        """Apply all operations on the values of (key, value) pairs, keeping track of the keys.
+
+        Pairs whose value is rejected by a filter are dropped. Only line-local operations
+        (maps and filters) are supported, since splitting a line has no single key.
+
+        Args:
+            pairs (Iterable[Tuple[Any, str]]): (key, line) pairs.
+
+        Raises:
+            ValueError: If an operation is neither a map nor a filter.
+
+        Returns:
+            List[Tuple[Any, str]]: (key, cleaned line) pairs that passed all filters.
+        """
+        return self._apply_local(pairs, self.operations)
+
+    @staticmethod
+    def _apply_local(pairs, operations):
+        output = list(pairs)
+        for op in operations:
+            if op.kind == "map":
+                output = [(key, op.fn(value)) for key, value in output]
+            elif op.kind == "filter":
+                output = [(key, value) for key, value in output if op.fn(value)]
+            else:
+                raise ValueError(
+                    "Only map and filter operations can be applied on records.")
         return output
 
     def clear(self):
         self.operations = []
+        self._stats, self._orders, self._n_batches = {}, {}, 0
+        self._fingerprints = {}
+        self._n_cacheable = None
+
+    def fingerprint(self, n_operations: int = None):
+        """Return a stable hash of the operations, their code and their arguments.
+
+        Two pipelines built by the same calls with the same arguments have the same fingerprint.
+        Operations with side effects are only described by their kind and function name, since the
+        state they capture (e.g. a report of the dropped lines) grows while cleaning.
+
+        Args:
+            n_operations (int, optional): only hash the first operations. Defaults to None (all).
+        """
+        operations = self.operations[:n_operations]
+        description = repr([(op.kind, describe_function(op.fnc)) if op.pure else
+                            (op.kind, "impure", getattr(op.fn or op.fnc, "__qualname__", type(op.fnc).__qualname__))
+                            for op in operations])
+        import hashlib
+        return hashlib.sha256(description.encode("utf-8")).hexdigest()[:32]
 
     def __len__(self):
         return len(self.operations)
@@ -31,3 +357,360 @@ class Sequential:
             raise IndexError(
                 f"Index must be in range [0,{len(self)}]. Your input: f{item}")
         return self.operations[item]
+
+
+def function_fingerprint(obj, strict=False):
+    """Return a stable hash of a function, its code and its captured values, see describe_function."""
+    import hashlib
+    return hashlib.sha256(repr(describe_function(obj, strict)).encode("utf-8")).hexdigest()[:32]
+
+
+def describe_function(obj, strict=False):
+    """Describe a function by its name, code and captured values, recursively, without memory addresses.
+
+    Args:
+        obj (Any): function or value to describe.
+        strict (bool, optional): True to raise instead of describing an object by its type only,
+            when its repr holds a memory address. Defaults to False.
+
+    Raises:
+        ValueError: If strict is True and the description would not tell apart differently
+            configured objects of the same type.
+    """
+    if isinstance(obj, partial):
+        return ("partial", describe_function(obj.func, strict),
+                tuple(describe_function(arg, strict) for arg in obj.args),
+                tuple((name, describe_function(value, strict)) for name, value in sorted(obj.keywords.items())))
+    code = getattr(obj, "__code__", None)
+    if code is not None:
+        closure = tuple(describe_function(cell.cell_contents, strict) for cell in obj.__closure__ or ())
+        defaults = describe_function(obj.__defaults__ or (), strict)
+        return (obj.__module__, obj.__qualname__, describe_function(code, strict), defaults, closure)
+    if hasattr(obj, "co_code"):
+        return (obj.co_name, obj.co_code, tuple(describe_function(const, strict) for const in obj.co_consts))
+    if isinstance(obj, (list, tuple)):
+        return tuple(describe_function(item, strict) for item in obj)
+    if isinstance(obj, (set, frozenset)):
+        return ("set", tuple(sorted(repr(describe_function(item, strict)) for item in obj)))
+    if isinstance(obj, dict):
+        return ("dict", tuple(sorted((repr(key), repr(describe_function(value, strict)))
+                                     for key, value in obj.items())))
+    bound_to = getattr(obj, "__self__", None)
+    if callable(obj) and bound_to is not None and not isinstance(bound_to, ModuleType):
+        # bound methods, e.g. the sub method of a compiled pattern, depend on their object
+        return ("method", obj.__qualname__, describe_function(bound_to, strict))
+    if callable(obj) and hasattr(obj, "__qualname__"):
+        return obj.__qualname__
+    description = repr(obj)
+    if " at 0x" in description:
+        if strict:
+            raise ValueError(f"{type(obj).__qualname__} objects have no stable description.")
+        return type(obj).__qualname__
+    return description
+
+
+def is_describable(obj):
+    """True if describe_function tells apart obj from any differently configured function."""
+    try:
+        describe_function(obj, strict=True)
+    except ValueError:
+        return False
+    return True
+
+
+class ByteBudget:
+    """Asyncio limiter on the number of bytes in flight.
+
+    Args:
+        max_bytes (int): maximum number of bytes that can be acquired at the same time.
+    """
+
+    def __init__(self, max_bytes: int):
+        assert max_bytes > 0
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        import asyncio
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, n_bytes: int):
+        # a single request larger than the budget is clamped so it can still run alone
+        n_bytes = min(n_bytes, self.max_bytes)
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight + n_bytes <= self.max_bytes)
+            self.in_flight += n_bytes
+        return n_bytes
+
+    async def resize(self, acquired: int, n_bytes: int) -> int:
+        """Replace an acquired amount by the actual size once it is known, without waiting.
+
+        Returns:
+            int: the amount to release later.
+        """
+        async with self._condition:
+            self.in_flight += n_bytes - acquired
+            if n_bytes < acquired:
+                self._condition.notify_all()
+        return n_bytes
+
+    async def release(self, n_bytes: int):
+        async with self._condition:
+            self.in_flight -= n_bytes
+            self._condition.notify_all()
+
+
+class CompactLines(Sequence):
+    """Memory efficient sequence of lines stored as one contiguous encoded buffer plus an offsets array.
+
+    A list of short strings costs about 50 bytes of overhead per line, while this store costs
+    8 bytes per line for the offset. Lines are decoded on access.
+
+    Args:
+        lines (Iterable[str], optional): initial lines. Defaults to ().
+        encoding (str, optional): encoding used to store the lines. Defaults to "utf-8".
+    """
+    # number of lines encoded at once when building the buffer
+    chunk_size = 2 ** 16
+
+    def __init__(self, lines: Iterable[str] = (), encoding="utf-8"):
+        self.encoding = encoding
+        self._buffer = bytearray()
+        self._offsets = array("Q", [0])
+        self.extend(lines)
+
+    def append(self, line: str):
+        self._buffer += line.encode(self.encoding)
+        self._offsets.append(len(self._buffer))
+
+    def extend(self, lines: Iterable[str]):
+        lines = iter(lines)
+        while True:
+            encoded = [line.encode(self.encoding) for line in islice(lines, self.chunk_size)]
+            if not encoded:
+                break
+            start = self._offsets[-1]
+            self._buffer += b"".join(encoded)
+            self._offsets.extend(islice(accumulate(chain([start], map(len, encoded))), 1, None))
+
+    @property
+    def nbytes(self):
+        """Number of bytes used by the buffer and the offsets."""
+        return len(self._buffer) + self._offsets.itemsize * len(self._offsets)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if item < 0 or item >= len(self):
+            raise IndexError(
+                f"Index must be in range [0,{len(self)}]. Your input: {item}")
+        return self._buffer[self._offsets[item]:self._offsets[item + 1]].decode(self.encoding)
+
+    def __iter__(self):
+        buffer, offsets, encoding = self._buffer, self._offsets, self.encoding
+        for i in range(len(self)):
+            yield buffer[offsets[i]:offsets[i + 1]].decode(encoding)
+
+    def __repr__(self):
+        return f"CompactLines({len(self)} lines, {self.nbytes} bytes)"
+
+
+class MappedLines(Sequence):
+    """Read only sequence of the lines of a memory-mapped file, decoded on access.
+
+    Leading and trailing whitespace of the file is ignored and every line is stripped, like
+    TextCleaner.set_text. Line offsets are indexed lazily: head, __getitem__ on the first lines
+    and iteration only scan as far as needed, tail scans backwards from the end, and len counts
+    newlines without building the index.
+
+    Args:
+        path (str): path of the file.
+        encoding (str, optional): encoding of the file. Defaults to "utf8".
+        skip_header (bool, optional): True to skip the first line. Defaults to False.
+        index (Union[bool, str], optional): True to build a LineIndex of the line offsets upfront, so
+            that len, indexing and sampling are O(1), or the cache directory where the index is
+            persisted and reused. Defaults to False.
+    """
+    _newline = re.compile(b"\n")
+    _whitespace = b" \t\r\n\x0b\x0c"
+    # number of bytes counted at once by __len__
+    chunk_size = 2 ** 24
+
+    def __init__(self, path: str, encoding="utf8", skip_header=False, index=False):
+        self.path = path
+        self.encoding = encoding
+        self.index = index
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        start, end = 0, len(self._mm)
+        if skip_header:
+            newline = self._mm.find(b"\n")
+            start = newline + 1 if newline != -1 else end
+        while start < end and self._mm[start] in self._whitespace:
+            start += 1
+        while end > start and self._mm[end - 1] in self._whitespace:
+            end -= 1
+        self._start, self._end = start, end
+        # start offset of each line indexed so far
+        self._offsets = array("Q", [start] if start < end else [])
+        self._complete = start >= end
+        self._len = 0 if start >= end else None
+        if index and not self._complete:
+            self._load_index()
+
+    def _load_index(self):
+        starts = LineIndex(self.path, cache_dir=self.index if isinstance(self.index, str) else None).starts
+        # raw lines overlapping [start, end), the first one starts at the first non whitespace byte
+        first = bisect_right(starts, self._start) - 1
+        last = bisect_left(starts, self._end)
+        self._offsets = starts[first:last]
+        self._offsets[0] = self._start
+        self._complete = True
+        self._len = len(self._offsets)
+
+    def _index(self, item=None):
+        """Index line starts until line `item` can be located, or until the end if item is None."""
+        if self._complete or (item is not None and item + 1 < len(self._offsets)):
+            return
+        found = (m.end() for m in self._newline.finditer(self._mm, self._offsets[-1], self._end))
+        needed = None if item is None else item + 2 - len(self._offsets)
+        before = len(self._offsets)
+        self._offsets.extend(found if needed is None else islice(found, needed))
+        if needed is None or len(self._offsets) - before < needed:
+            self._complete = True
+            self._len = len(self._offsets)
+
+    def _decode(self, start, stop):
+        return self._mm[start:stop].decode(self.encoding).strip()
+
+    def _line(self, item):
+        self._index(item)
+        if item >= len(self._offsets):
+            raise IndexError(
+                f"Index must be in range [0,{len(self)}]. Your input: {item}")
+        stop = self._offsets[item + 1] - 1 if item + 1 < len(self._offsets) else self._end
+        return self._decode(self._offsets[item], stop)
+
+    def _tail(self, num_lines):
+        lines, stop = [], self._end
+        while len(lines) < num_lines and stop > self._start:
+            newline = self._mm.rfind(b"\n", self._start, stop)
+            lines.append(self._decode(newline + 1 if newline != -1 else self._start, stop))
+            stop = newline if newline != -1 else self._start
+        return lines[::-1]
+
+    def __len__(self):
+        if self._len is None and self._start >= self._end:
+            self._len = 0
+        if self._len is None:
+            count = 0
+            for i in range(self._start, self._end, self.chunk_size):
+                count += self._mm[i:min(i + self.chunk_size, self._end)].count(b"\n")
+            self._len = count + 1
+        return self._len
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self._slice(item)
+        if item < 0 and not self._complete:
+            # read backwards from the end instead of counting the lines
+            lines = self._tail(-item)
+            if len(lines) == -item:
+                return lines[0]
+        if item < 0:
+            item += len(self)
+        if item < 0:
+            raise IndexError(
+                f"Index must be in range [0,{len(self)}]. Your input: {item}")
+        return self._line(item)
+
+    def _slice(self, item):
+        """Serve head and tail slices without counting the lines, other slices with len."""
+        start, stop = item.start or 0, item.stop
+        if item.step in (None, 1) and not self._complete:
+            if start >= 0 and stop is not None and stop >= 0:
+                lines = []
+                for i in range(start, stop):
+                    try:
+                        lines.append(self._line(i))
+                    except IndexError:
+                        break
+                return lines
+            if start < 0 and stop is None:
+                return self._tail(-start)
+        start, stop, step = item.indices(len(self))
+        if step == 1 and not self._complete and start > len(self) // 2:
+            # lines close to the end are read backwards instead of indexing the whole file
+            return self._tail(len(self) - start)[:max(0, stop - start)]
+        return [self._line(i) for i in range(start, stop, step)]
+
+    def __iter__(self):
+        if self._start >= self._end:
+            return
+        start = self._start
+        for m in self._newline.finditer(self._mm, self._start, self._end):
+            yield self._decode(start, m.start())
+            start = m.end()
+        yield self._decode(start, self._end)
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+
+    def __repr__(self):
+        return f"MappedLines({self.path!r})"
+
+
+class PendingLines(Sequence):
+    """Lines waiting for a chain of maps and filters to run on partitions in worker processes.
+
+    Consecutive operations are accumulated and run together on first access, so the worker pool
+    is forked, and the lines packed to and unpacked from shared memory, once per chain instead of
+    once per operation.
+
+    Args:
+        lines (Sequence[str]): input lines.
+        operations (List[Callable]): operations to apply, see parallel.parallel_apply.
+        n_workers (int): number of worker processes.
+        new_lines (Callable, optional): materializes the processed lines, e.g. as CompactLines.
+            Defaults to None (list).
+    """
+
+    def __init__(self, lines, operations, n_workers, new_lines=None):
+        self.source = lines
+        self.operations = list(operations)
+        self.n_workers = n_workers
+        self._new_lines = new_lines or list
+        self._result = None
+
+    def then(self, fnc):
+        """Return the lines waiting for one more operation."""
+        if self._result is not None:
+            return PendingLines(self._result, [fnc], self.n_workers, self._new_lines)
+        return PendingLines(self.source, self.operations + [fnc], self.n_workers, self._new_lines)
+
+    def materialize(self):
+        """Run the pending operations, once, and return the processed lines."""
+        if self._result is None:
+            from xinaprocessor.parallel import parallel_apply
+            self._result = self._new_lines(parallel_apply(self.source, self.operations, self.n_workers))
+            self.source = None
+        return self._result
+
+    def __len__(self):
+        return len(self.materialize())
+
+    def __getitem__(self, item):
+        return self.materialize()[item]
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def __eq__(self, other):
+        return self.materialize() == (other.materialize() if isinstance(other, PendingLines) else other)
+
+    def __repr__(self):
+        return f"PendingLines({len(self.operations)} operations)"
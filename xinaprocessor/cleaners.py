@@ -1,23 +1,43 @@
 from xinaprocessor.base import BaseCleaner
+from xinaprocessor.classes import ByteBudget, CompactLines, MappedLines
+from xinaprocessor.compression import detect_compression, open_binary, open_text
+from xinaprocessor.index import LineIndex
+from xinaprocessor.shards import ShardedOutput
+from xinaprocessor.tokenizer import Tokenizer, token_frequency
 from xinaprocessor.helper import *
+import csv
+import fnmatch
+import re
+import json
+import queue
+import shutil
+import threading
+import time
 import warnings
-from tqdm import tqdm
 import os
 import sys
-from typing import List
-import concurrent.futures as con
-from statistics import median_grouped, stdev, variance
+from typing import List, Union
+from functools import partial
+
+
+# line indexes, checkpoints, temporary files and chunk parts written by the cleaners, never cleaned
+SIDECAR_PATTERN = re.compile(r"(\.idx|\.ckpt|\.tmp|\.part\d{5}(\.[^.]+)?)$")
 
 
 class TextCleaner(BaseCleaner):
-    def __init__(self, text: str, sep: str = "\n"):
+    def __init__(self, text: str, sep: str = "\n", compact=False, n_workers=1):
         """A class to clean text.
 
         Args:
             text (str): Input text to be cleaned.
             sep (str, optional): Separator to split text on. Defaults to "\n".
+            compact (bool, optional): True to store lines in one contiguous buffer, which uses several
+                times less memory for short lines. Defaults to False.
+            n_workers (int, optional): number of processes running the maps and filters on large
+                texts, see BaseCleaner.set_workers. Defaults to 1.
         """
-        super().__init__()
+        super().__init__(compact=compact)
+        self.set_workers(n_workers)
 
         self.sep = sep
         self.set_text(text, sep)
@@ -36,18 +56,20 @@ class TextCleaner(BaseCleaner):
         return TextCleaner(text, sep)
 
     @staticmethod
-    def create_cleaner_from_list(lst: List[str], sep: str = "\n"):
+    def create_cleaner_from_list(lst: List[str], sep: str = "\n", compact=False, n_workers=1):
         r"""Creates a TextCleaner object given list of lines.
 
         Args:
             lst (List[str]): List of lines to be cleaned
             sep (str, optional): Separator used to join the lines. Defaults to "\\n".
+            compact (bool, optional): True to store lines in one contiguous buffer. Defaults to False.
+            n_workers (int, optional): number of processes running the maps and filters. Defaults to 1.
 
         Returns:
             TextCleaner: text cleaner object.
         """
-        cleaner = TextCleaner.create_cleaner('', sep)
-        cleaner.lines = lst
+        cleaner = TextCleaner('', sep, compact, n_workers)
+        cleaner.lines = CompactLines(lst) if compact else lst
         return cleaner
 
     def get_arabic_text(self):
@@ -90,6 +112,35 @@ class TextCleaner(BaseCleaner):
         """
         return list(set("".join(self.lines)))
 
+    def get_script_profile(self) -> dict:
+        """Return the ratio of characters of each script class in the text, excluding spaces.
+        See helper.SCRIPT_CLASSES for the classes.
+        """
+        counts = Counter()
+        for line in self.lines:
+            counts.update(script_counts(line))
+        return script_ratios(counts)
+
+    def get_token_spans(self, tokenizer: Tokenizer = None):
+        """Tokenize all lines at once into (start, end) offsets, see tokenizer.Tokenizer.spans_batch.
+
+        Args:
+            tokenizer (Tokenizer, optional): tokenizer to use. Defaults to None (Tokenizer()).
+
+        Returns:
+            Tuple[array, array]: flat token offsets, and the index of the first token of each line.
+        """
+        return (tokenizer or Tokenizer()).spans_batch(self.lines)
+
+    def get_token_frequency(self, tokenizer: Tokenizer = None) -> Counter:
+        """Count the tokens of all lines.
+
+        Args:
+            tokenizer (Tokenizer, optional): tokenizer to use. Defaults to None (Tokenizer()).
+        """
+        spans, line_starts = self.get_token_spans(tokenizer)
+        return token_frequency(self.lines, spans, line_starts)
+
     def get_lines_below_len(self, length: int):
         """Extracts lines with length below a threshold
 
@@ -150,21 +201,25 @@ class TextCleaner(BaseCleaner):
     def get_median_len(self) -> float:
         """Returns the Median of all lines' length
         """
+        from statistics import median_grouped
         return median_grouped(self.get_lines_lens())
 
     def get_var_len(self) -> float:
         """Returns the variance of all lines' length
         """
+        from statistics import variance
         return variance(self.get_lines_lens())
 
     def get_std_len(self) -> float:
         """Returns the standard deviation of all lines' length
         """
+        from statistics import stdev
         return stdev(self.get_lines_lens())
 
     def describe_lines_len(self) -> dict:
         """Return dictionary contains a statistical description about the lines' lengths
         """
+        from statistics import median_grouped, stdev, variance
         lines_lens = self.get_lines_lens()
         return {"max_length": max(lines_lens),
                 "min_length": min(lines_lens),
@@ -174,6 +229,17 @@ class TextCleaner(BaseCleaner):
                 "length_standard_deviation": stdev(lines_lens)
                 }
 
+    def _check_num_samples(self, num_samples):
+        # looks up a single line instead of counting all the lines of a lazy file
+        if num_samples >= 0:
+            try:
+                self.lines[num_samples]
+                return
+            except IndexError:
+                pass
+        raise IndexError(
+            f"Number of samples must be in range [0, {len(self)}]. Your input {num_samples}")
+
     def head(self, num_samples=1):
         """Return lines from the start of the text
 
@@ -186,9 +252,7 @@ class TextCleaner(BaseCleaner):
         Returns:
             List[str]: list of top (num_samples) strings
         """
-        if num_samples < 0 or num_samples >= len(self):
-            raise IndexError(
-                f"Number of samples must be in range [0, f{len(self)}]. Your input {num_samples}")
+        self._check_num_samples(num_samples)
         return self.lines[:num_samples]
 
     def tail(self, num_samples=1):
@@ -203,9 +267,7 @@ class TextCleaner(BaseCleaner):
         Returns:
             List[str]: list of bottom (num_samples) strings
         """
-        if num_samples < 0 or num_samples >= len(self):
-            raise IndexError(
-                f"Number of samples must be in range [0, f{len(self)}]. Your input {num_samples}")
+        self._check_num_samples(num_samples)
         return self.lines[-num_samples:]
 
     def sample(self, num_samples=1, seed=None):
@@ -221,9 +283,7 @@ class TextCleaner(BaseCleaner):
         Returns:
             List[str]: list of randomly selected (num_samples) strings
         """
-        if num_samples < 0 or num_samples >= len(self):
-            raise IndexError(
-                f"Number of samples must be in range [0, f{len(self)}]. Your input {num_samples}")
+        self._check_num_samples(num_samples)
         if seed:
             random.seed(seed)
         return random.sample(self.lines, num_samples)
@@ -231,7 +291,7 @@ class TextCleaner(BaseCleaner):
     def remove_duplicates(self):
         """Remove all duplicates from text
         """
-        self.lines = list(dict.fromkeys(self.lines))
+        self.lines = self._new_lines(dict.fromkeys(self.lines))
         return self
 
     def save2file(self, path: str, encoding = 'utf-8'):
@@ -261,7 +321,7 @@ class TextCleaner(BaseCleaner):
         assert keep is not None
         if not isinstance(keep, list):
             keep = list(keep)
-        self.lines = self._mapper(self.lines, lambda x: keep_only(x, keep))
+        self.lines = self._mapper(self._lines, lambda x: keep_only(x, keep))
 
         return self
 
@@ -292,19 +352,35 @@ class FileCleaner(TextCleaner):
         encoding (str, optional): encoding of the input file. Defaults to "utf8".
         header (bool, optional): true if the file contains header. Defaults to None.
         large (bool, optional): true if you want to process large files. Defaults to False
+        lazy (bool, optional): true to memory-map the file instead of reading it. Lines are decoded on demand,
+            so head, tail, sample, len and indexing are served from the mapping until the first
+            transforming operation loads the lines in memory. Defaults to False.
+        compact (bool, optional): true to store the lines in one contiguous buffer. Defaults to False.
+        index (Union[bool, str], optional): true to use a line-offset index (see LineIndex) in lazy mode,
+            or the cache directory where the index is persisted. Defaults to False.
 
     Raises:
         FileNotFoundError: If file does not exist.
         OSError: If file size is larger than 1 GB.
 
     Examples:
+        >>> cleaner = FileCleaner('large_file.txt', lazy=True)
+        >>> cleaner.head(5)
     """
 
     def __init__(self, filepath: str, savepath: str = None, encoding="utf8",
-                 header: bool = None, large: bool = False) -> None:
+                 header: bool = None, large: bool = False, lazy: bool = False, compact: bool = False,
+                 index: Union[bool, str] = False) -> None:
 
         if not os.path.isfile(filepath):
             raise FileNotFoundError("File does not exist.")
+        if lazy:
+            self.savepath = savepath
+            self.encoding = encoding
+            BaseCleaner.__init__(self, compact=compact)
+            self.sep = "\n"
+            self.lines = MappedLines(filepath, encoding, skip_header=bool(header), index=index)
+            return
         # raise error if the file size is larger than one GB
         if not large and os.path.getsize(filepath) / 2 ** 30 > 1:
             raise OSError("File too large. It is prefable to use FileStreamCleaner instead.\n"
@@ -315,8 +391,8 @@ class FileCleaner(TextCleaner):
         self.encoding = encoding
 
         if header:
-            self.file = next(self.file)
-        super().__init__(self.file.read())
+            next(self.file)
+        super().__init__(self.file.read(), compact=compact)
 
     def save(self):
         self.save2file(self.savepath, self.encoding)
@@ -335,19 +411,40 @@ class FileStreamCleaner(BaseCleaner):
             If None, all columns will be processed
             Will only be applied when sep is specified.
         header (bool, optional): true if the file contains header. Defaults to None.
+        compression (str, optional): compression of the saved file, one of "gzip", "bz2", "xz", None
+            or "infer" to detect it from the extension of savepath. Defaults to "infer".
+            Compressed input files (.gz, .bz2, .xz) are always detected and decompressed on the fly.
+        compress_workers (int, optional): number of threads used to compress the output. Defaults to 4.
+        csv_mode (bool, optional): True to parse the file as CSV/TSV records with the csv module.
+            Only the selected columns are cleaned, the other columns are kept untouched, and a row is
+            dropped when a filter rejects one of its cleaned columns. Requires sep. Defaults to False.
     """
 
     def __init__(self, filepath: str, savepath: str = None, encoding="utf8",
-                 sep: str = None, columns: List[int] = None, header: bool = None) -> None:
+                 sep: str = None, columns: List[int] = None, header: bool = None,
+                 compression="infer", compress_workers=4, csv_mode=False) -> None:
         super().__init__(stream=True)
+        if csv_mode and not sep:
+            raise ValueError("sep must be specified when csv_mode is True.")
         self.encoding = encoding
         self.sep = sep
         self.columns = columns or []
         self.header = header
+        self.compression = compression
+        self.compress_workers = compress_workers
+        self.csv_mode = csv_mode
+        # shows a progress bar while cleaning
+        self.progress = True
+        # directory where the line index used by len, head, tail and sample is persisted,
+        # None to keep it in memory
+        self.index_dir = None
+        self._input_offset = None
+        # end of the byte range being cleaned, see clean_range
+        self._input_end = None
         self._set_newfile(filepath, savepath)
 
     def _add_split(self):
-        if self.sep:
+        if self.sep and not self.csv_mode:
             self.split_lines_on(self.sep) if not self.columns else self.split_and_remove_lines_on(
                 self.sep, self.columns)
 
@@ -370,63 +467,416 @@ class FileStreamCleaner(BaseCleaner):
         return savepath
 
     def _handle_header(self, save=True):
-        self.header = next(self.file) if self.header else None
+        self.header = next(self._iter_lines(), None) if self.header else None
         if self.header and save:
             self.savefile.write(self.header)
 
     def _prepare_handlers(self):
-        self.savefile = open(self.savepath, "w", encoding=self.encoding)
-        self.file = open(self.filepath, "r", encoding=self.encoding)
+        # the csv module handles newlines inside quoted fields itself
+        newline = "" if self.csv_mode else None
+        self.savefile = open_text(self.savepath, "w", self.encoding, self.compression, self.compress_workers,
+                                  newline=newline)
+        self.file = open_text(self.filepath, "r", self.encoding, newline=newline)
 
     def _prepare_clean(self):
         self._prepare_handlers()
         self._handle_header()
 
     def _get_tqdm(self):
+        from tqdm import tqdm
+        # progress is counted in decoded bytes, so the size of a compressed file is meaningless
+        compressed = detect_compression(self.filepath) is not None
         return tqdm(
-            total=os.path.getsize(self.filepath),
+            total=None if compressed else os.path.getsize(self.filepath),
             desc="Processing",
             unit="B",
             unit_scale=True,
             file=sys.stdout,
             # position=0,
             leave=True,
+            disable=not self.progress,
         )
 
     def _save_lines(self, lines: List[str]):
         col_len = max(1, len(self.columns))
         for i in range(0, len(lines), col_len):
-            line = self._join_text(lines[i:i + col_len])
+            line = self._join_text(lines[i:i + col_len], self.sep)
             self.savefile.write(line + '\n')
 
     def _apply_and_save(self):
         cleaned = self._sequential.apply(self.lines)
         self._save_lines(cleaned)
 
-    def clean(self, n_lines=10):
+    def _iter_lines(self, pbar=None):
+        if self._input_offset is not None:
+            # binary input, the offset of the next line is tracked for checkpoints
+            for raw in self.file:
+                if self._input_end is not None and self._input_offset >= self._input_end:
+                    break
+                self._input_offset += len(raw)
+                if pbar is not None:
+                    pbar.update(len(raw))
+                yield raw.decode(self.encoding)
+            return
+        for line in self.file:
+            if pbar is not None:
+                pbar.update(len(line.encode(self.encoding)))
+            yield line
+
+    def _read_batches(self, n_lines, pbar=None):
+        """Yield batches of n_lines lines, or of n_lines parsed rows in csv mode."""
+        lines = self._iter_lines(pbar)
+        if self.csv_mode:
+            lines = csv.reader(lines, delimiter=self.sep)
+        return iter_batches(lines, n_lines)
+
+    def _clean_batch(self, batch):
+        return self._clean_rows(batch) if self.csv_mode else self._sequential.apply(batch)
+
+    def _write_batch(self, batch):
+        if self.csv_mode:
+            csv.writer(self.savefile, delimiter=self.sep, lineterminator="\n").writerows(batch)
+        else:
+            self._save_lines(batch)
+
+    def _clean_rows(self, rows: List[List[str]]):
+        """Clean the selected columns of a batch of rows, dropping rows rejected by a filter."""
+        columns = self.columns or range(max(map(len, rows)))
+        return self._clean_fields(rows, columns, lambda row, col: col < len(row))
+
+    def _clean_fields(self, records, keys, has_key):
+        """Clean the `keys` fields of a batch of records in place.
+        Records for which a filter rejects one of the cleaned fields are dropped.
+        """
+        keep = [True] * len(records)
+        for key in keys:
+            cells = [(i, record[key]) for i, record in enumerate(records) if keep[i] and has_key(record, key)]
+            cleaned = dict(self._sequential.apply_keyed(cells))
+            for i, _ in cells:
+                if i in cleaned:
+                    records[i][key] = cleaned[i]
+                else:
+                    keep[i] = False
+        return [record for record, kept in zip(records, keep) if kept]
+
+    def _clean_threaded(self, n_lines, queue_size, pbar):
+        """Read/decode and encode/write in dedicated threads while cleaning in the calling thread.
+        Bounded queues keep memory flat, and a single consumer per queue keeps the output order.
+        """
+        read_queue = queue.Queue(maxsize=queue_size)
+        write_queue = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+        errors = []
+
+        def read():
+            try:
+                for lines in self._read_batches(n_lines, pbar):
+                    if stop.is_set():
+                        break
+                    read_queue.put(lines)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                read_queue.put(None)
+
+        def write():
+            while True:
+                lines = write_queue.get()
+                if lines is None:
+                    break
+                if stop.is_set():
+                    continue
+                try:
+                    self._write_batch(lines)
+                except Exception as e:
+                    errors.append(e)
+                    stop.set()
+
+        reader = threading.Thread(target=read, daemon=True)
+        writer = threading.Thread(target=write, daemon=True)
+        reader.start()
+        writer.start()
+        try:
+            while True:
+                lines = read_queue.get()
+                if lines is None:
+                    break
+                if not stop.is_set():
+                    write_queue.put(self._clean_batch(lines))
+        except BaseException:
+            stop.set()
+            while read_queue.get() is not None:
+                pass
+            raise
+        finally:
+            write_queue.put(None)
+            reader.join()
+            writer.join()
+        if errors:
+            raise errors[0]
+
+    def clean(self, n_lines=10, threaded=False, queue_size=4, checkpoint_interval=None, resume=False):
         """Clean the input file by applying all selected functions in sequence.
 
         Args:
             n_lines (int, optional): number of lines to be processed at the same time. Defaults to 10.
+            threaded (bool, optional): True to read and write in dedicated threads, so that slow disks
+                overlap with cleaning. Defaults to False.
+            queue_size (int, optional): maximum number of batches waiting between two stages
+                when threaded is True. Defaults to 4.
+            checkpoint_interval (float, optional): number of seconds between two checkpoints saved to
+                savepath + '.ckpt'. Defaults to None (no checkpoints), or 60 when resume is True.
+            resume (bool, optional): True to truncate the output to the last checkpoint and continue from
+                the matching input offset. Starts from scratch if there is no checkpoint. Defaults to False.
+
+        Raises:
+            ValueError: If checkpoints are used with threaded, or the checkpoint was saved by another pipeline.
+        """
+        self._check_sequential()
+        if checkpoint_interval is not None or resume:
+            if threaded:
+                raise ValueError("Checkpoints are not supported with threaded=True.")
+            self._clean_resumable(n_lines, 60 if checkpoint_interval is None else checkpoint_interval, resume)
+            return
+        self._prepare_clean()
+        self._run_clean(n_lines, threaded, queue_size)
+
+    def _checkpoint_path(self):
+        return self.savepath + ".ckpt"
+
+    def _load_checkpoint(self):
+        if not os.path.isfile(self._checkpoint_path()):
+            return None
+        with open(self._checkpoint_path(), encoding="utf8") as f:
+            checkpoint = json.load(f)
+        if checkpoint["fingerprint"] != self._sequential.fingerprint():
+            raise ValueError(
+                f"{self._checkpoint_path()} was saved by a different pipeline, remove it to start over.")
+        return checkpoint
+
+    def _save_checkpoint(self, complete=False):
+        """Atomically record how far the input was consumed and how much output it produced.
+        The output is synced first, so a checkpoint never points past the data on disk."""
+        self.savefile.flush()
+        # the savefile may be a compressing wrapper, a separate descriptor syncs the same file
+        fd = os.open(self.savepath, os.O_RDWR)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        checkpoint = {
+            "input_offset": self._input_offset,
+            "output_offset": os.path.getsize(self.savepath),
+            "fingerprint": self._sequential.fingerprint(),
+            "complete": complete,
+        }
+        tmp_path = self._checkpoint_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._checkpoint_path())
+
+    def _clean_resumable(self, n_lines, checkpoint_interval, resume):
+        checkpoint = self._load_checkpoint() if resume else None
+        if checkpoint and checkpoint["complete"]:
+            return
+        if checkpoint and not (os.path.isfile(self.savepath)
+                               and os.path.getsize(self.savepath) >= checkpoint["output_offset"]):
+            # truncating would pad the output with null bytes
+            warnings.warn(f"{self.savepath} is shorter than its checkpoint, cleaning from scratch.")
+            checkpoint = None
+        newline = "" if self.csv_mode else None
+        self.file = open_binary(self.filepath)
+        if checkpoint:
+            # everything written after the checkpoint is discarded and produced again
+            os.truncate(self.savepath, checkpoint["output_offset"])
+            self.savefile = open_text(self.savepath, "a", self.encoding, self.compression, self.compress_workers,
+                                      newline=newline)
+            self.file.seek(checkpoint["input_offset"])
+            self._input_offset = checkpoint["input_offset"]
+            self.header = None
+        else:
+            self.savefile = open_text(self.savepath, "w", self.encoding, self.compression, self.compress_workers,
+                                      newline=newline)
+            self._input_offset = 0
+            self._handle_header()
+        try:
+            self.clear_text()
+            last_checkpoint = time.monotonic()
+            with self._get_tqdm() as pbar:
+                pbar.update(self._input_offset)
+                for batch in self._read_batches(n_lines, pbar):
+                    self._write_batch(self._clean_batch(batch))
+                    if time.monotonic() - last_checkpoint >= checkpoint_interval:
+                        self._save_checkpoint()
+                        last_checkpoint = time.monotonic()
+            self._save_checkpoint(complete=True)
+        finally:
+            self._input_offset = None
+            self._close_handlers()
+
+    def clean_range(self, start: int, end: int, n_lines=10):
+        """Clean the lines starting in the byte range [start, end) of the input file into savepath.
+
+        Used to clean a large file as several chunks in parallel. start must be 0 or the offset
+        following a newline, and the header, if any, is only handled by the chunk starting at 0.
+
+        Args:
+            start (int): offset of the first line.
+            end (int): lines starting at or after this offset are left to the next chunk.
+            n_lines (int, optional): number of lines to be processed at the same time. Defaults to 10.
+
+        Raises:
+            ValueError: If the input file is compressed or csv_mode is True, since neither can be
+                split on byte offsets.
         """
+        self._check_sequential()
+        if self.csv_mode or detect_compression(self.filepath) is not None:
+            raise ValueError("Only uncompressed files outside csv_mode can be cleaned by range.")
+        self.file = open_binary(self.filepath)
+        self.file.seek(start)
+        self.savefile = open_text(self.savepath, "w", self.encoding, self.compression, self.compress_workers)
+        self._input_offset, self._input_end = start, end
+        try:
+            if start:
+                self.header = None
+            self._handle_header()
+            self.clear_text()
+            for batch in self._read_batches(n_lines):
+                self._write_batch(self._clean_batch(batch))
+        finally:
+            self._input_offset = self._input_end = None
+            self._close_handlers()
+
+    def _check_sequential(self):
         if len(self._sequential) == 0:
             raise ValueError(
                 "Make sure to call the functions you want before start cleaning.")
-        self._prepare_clean()
 
+    def _run_clean(self, n_lines, threaded, queue_size):
         self.clear_text()
         with self._get_tqdm() as pbar:
             if self.header:
                 pbar.update(len(self.header.encode(self.encoding)))
-            for i, line in enumerate(self.file, 1):
-                pbar.update(len(line.encode(self.encoding)))
-                self.add_text(line)
-                if i % n_lines == 0:
-                    self._apply_and_save()
-                    self.clear_text()
+            if threaded:
+                self._clean_threaded(n_lines, queue_size, pbar)
+            else:
+                for batch in self._read_batches(n_lines, pbar):
+                    self._write_batch(self._clean_batch(batch))
+
+    def clean_sharded(self, savedir: str = None, max_bytes: int = None, max_lines: int = None,
+                      template="part-{:05d}.txt", n_lines=10, threaded=False, queue_size=4,
+                      output: ShardedOutput = None):
+        """Clean the input file into shards of roughly fixed size instead of a single file.
 
-        if len(self.lines) > 0:
-            self._apply_and_save()
+        A new shard is started when the current one reaches max_bytes or max_lines, and a
+        manifest listing the line and byte counts of each shard is written to savedir.
+
+        Args:
+            savedir (str, optional): directory of the shards. Defaults to None.
+                If None, the directory of savepath is used.
+            max_bytes (int, optional): maximum number of (uncompressed) bytes per shard. Defaults to None.
+            max_lines (int, optional): maximum number of lines per shard. Defaults to None.
+            template (str, optional): name template of the shards. Defaults to "part-{:05d}.txt".
+            n_lines (int, optional): number of lines to be processed at the same time. Defaults to 10.
+            threaded (bool, optional): True to read and write in dedicated threads. Defaults to False.
+            queue_size (int, optional): maximum number of batches waiting between two stages. Defaults to 4.
+            output (ShardedOutput, optional): shared output to write to, in which case the manifest is
+                left to its owner. Defaults to None.
+
+        Returns:
+            List[dict]: manifest entries of the shards written so far.
+        """
+        self._check_sequential()
+        owner = output is None
+        if owner:
+            output = ShardedOutput(savedir or os.path.dirname(self.savepath) or ".", template, max_bytes,
+                                   max_lines, self.encoding, self.compression, self.compress_workers)
+        self.file = open_text(self.filepath, "r", self.encoding, newline="" if self.csv_mode else None)
+        self._handle_header(save=False)
+        self.savefile = output.writer(self.header)
+        try:
+            self._run_clean(n_lines, threaded, queue_size)
+        finally:
+            self.savefile.close()
+            self.file.close()
+        if owner:
+            output.write_manifest()
+        return output.manifest
+
+    def _split_key(self, record):
+        if self.csv_mode:
+            return self.sep.join(record)
+        # the last line may have no line ending, it must land with its duplicates
+        return record.rstrip("\r\n")
+
+    def _get_split_key(self, key):
+        if key is None:
+            return self._split_key
+        if callable(key):
+            return key
+        return lambda record: record[key]
+
+    def get_split_paths(self, names: List[str]):
+        """Return the path of each split file, derived from savepath (e.g. 'data_cleaned_train.txt').
+
+        Args:
+            names (List[str]): names of the splits.
+        """
+        root, extension = os.path.splitext(self.savepath)
+        if detect_compression(self.savepath, use_magic=False):
+            root, inner_extension = os.path.splitext(root)
+            extension = inner_extension + extension
+        return [f"{root}_{name}{extension}" for name in names]
+
+    def clean_split(self, splits: dict, seed=0, n_lines=10, key=None):
+        """Clean the input file and write each line (or record) to one of several split files in one pass.
+
+        Each line is assigned to a split by a seeded hash of its cleaned content (or of its key), so
+        splits are reproducible across runs and machines and identical lines never leak across splits.
+
+        Args:
+            splits (dict): mapping from split name to its relative size, e.g. {"train": 0.8, "test": 0.2}.
+            seed (int, optional): seed of the assignment. Defaults to 0.
+            n_lines (int, optional): number of lines to be processed at the same time. Defaults to 10.
+            key (Union[int, str, Callable], optional): what is hashed, a column index in csv mode, a
+                field name for JSON Lines, or a function returning a string from a cleaned line or
+                record. Defaults to None (the cleaned line, row or text fields).
+
+        Raises:
+            ValueError: If sep is used without csv_mode, since cells of a row would be split apart.
+
+        Returns:
+            List[str]: paths of the split files.
+        """
+        if self.sep and not self.csv_mode:
+            raise ValueError("Use csv_mode=True to split files with columns.")
+        names = list(splits)
+        split = hash_splitter(list(splits.values()), seed)
+        split_key = self._get_split_key(key)
+        savepaths = self.get_split_paths(names)
+        savefiles = [open_text(path, "w", self.encoding, self.compression, self.compress_workers,
+                               newline="" if self.csv_mode else None) for path in savepaths]
+        self.file = open_text(self.filepath, "r", self.encoding, newline="" if self.csv_mode else None)
+        try:
+            self.header = next(self.file) if self.header else None
+            for savefile in savefiles:
+                if self.header:
+                    savefile.write(self.header)
+            for batch in self._read_batches(n_lines):
+                groups = [[] for _ in names]
+                for record in self._clean_batch(batch):
+                    groups[split(split_key(record))].append(record)
+                for savefile, group in zip(savefiles, groups):
+                    if group:
+                        self.savefile = savefile
+                        self._write_batch(group)
+        finally:
+            for savefile in savefiles:
+                savefile.close()
+            self.file.close()
+        return savepaths
 
     def clean_sample(self, n_lines=1000):
         """Clean a sample of the input file by applying all selected functions in sequence.
@@ -436,11 +886,9 @@ class FileStreamCleaner(BaseCleaner):
         """
         self._prepare_clean()
         self.clear_text()
-        for i, line in enumerate(self.file, 1):
-            self.add_text(line)
-            if i % n_lines == 0:
-                self._apply_and_save()
-                break
+        for batch in self._read_batches(n_lines):
+            self._write_batch(self._clean_batch(batch))
+            break
 
     def get_unique_chars(self):
         """Find all unique characters presented in the file
@@ -456,12 +904,174 @@ class FileStreamCleaner(BaseCleaner):
                 chars.update(list(''.join(line)))
         return list(chars)
 
-    def __del__(self):
+    def _get_index(self):
+        if detect_compression(self.filepath):
+            raise ValueError("Random access is not supported for compressed files.")
+        if not hasattr(self, "_index"):
+            self._index = LineIndex(self.filepath, cache_dir=self.index_dir)
+        return self._index.update()
+
+    def _read_line(self, item):
+        start, end = self._get_index()[item]
+        with open(self.filepath, "rb") as f:
+            f.seek(start)
+            return f.read(end - start).decode(self.encoding).rstrip("\r")
+
+    def head(self, num_samples=1):
+        """Return lines from the start of the input file, using its line index.
+
+        Args:
+            num_samples (int, optional): number of lines to return. Defaults to 1.
+
+        Returns:
+            List[str]: list of top (num_samples) lines
+        """
+        return [self._read_line(i) for i in range(min(num_samples, len(self)))]
+
+    def tail(self, num_samples=1):
+        """Return lines from the end of the input file, using its line index.
+
+        Args:
+            num_samples (int, optional): number of lines to return. Defaults to 1.
+
+        Returns:
+            List[str]: list of bottom (num_samples) lines
+        """
+        return [self._read_line(i) for i in range(max(0, len(self) - num_samples), len(self))]
+
+    def sample(self, num_samples=1, seed=None):
+        """Uniformly select lines from the input file, using its line index.
+
+        Args:
+            num_samples (int, optional): number of lines to select. Defaults to 1.
+            seed (int, optional): seed for reproducibility. Defaults to None.
+
+        Returns:
+            List[str]: list of randomly selected (num_samples) lines
+        """
+        indices = random.Random(seed).sample(range(len(self)), num_samples)
+        return [self._read_line(i) for i in indices]
+
+    def __getitem__(self, item):
+        return self._read_line(item)
+
+    def __len__(self):
+        """Number of lines in the input file, including the header."""
+        return len(self._get_index())
+
+    def _close_handlers(self):
         if hasattr(self, "file"):
             self.file.close()
         if hasattr(self, "savefile"):
             self.savefile.close()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._close_handlers()
+
+    def __del__(self):
+        self._close_handlers()
+
+
+class JsonlStreamCleaner(FileStreamCleaner):
+    """Clean JSON Lines files field by field in a streaming manner.
+
+    Each record is parsed, the configured fields are cleaned in batches, and the record is
+    serialized back. A record is dropped when a filter rejects one of its cleaned fields.
+    Fields that are missing or not strings, and lines that are not JSON objects (arrays, strings,
+    numbers, null), are kept untouched.
+    orjson or ujson are used when installed.
+
+    Args:
+        filepath (str): path of the file to be processed
+        savepath (str, optional): path to save the processed records. Defaults to None
+            If None, the file will be saved in the same directory with a suffix '_cleaned'.
+        fields (List[str], optional): names of the fields to be cleaned. Defaults to ["text"].
+        encoding (str, optional): encoding of the input file. Defaults to "utf8".
+        compression (str, optional): compression of the saved file, see FileStreamCleaner.
+            Defaults to "infer".
+        compress_workers (int, optional): number of threads used to compress the output. Defaults to 4.
+    """
+
+    def __init__(self, filepath: str, savepath: str = None, fields: List[str] = None, encoding="utf8",
+                 compression="infer", compress_workers=4) -> None:
+        self.fields = fields or ["text"]
+        super().__init__(filepath, savepath, encoding=encoding, compression=compression,
+                         compress_workers=compress_workers)
+
+    def _read_batches(self, n_lines, pbar=None):
+        records = (json_loads(line) for line in self._iter_lines(pbar) if line.strip())
+        return iter_batches(records, n_lines)
+
+    def _clean_batch(self, batch):
+        return self._clean_fields(batch, self.fields,
+                                  lambda record, field: isinstance(record, dict)
+                                  and isinstance(record.get(field), str))
+
+    def _write_batch(self, batch):
+        self.savefile.write("".join(json_dumps(record) + "\n" for record in batch))
+
+    def _split_key(self, record):
+        # only the cleaned text, so records differing by their ids still land in the same split
+        if isinstance(record, dict):
+            return json_dumps([record.get(field) for field in self.fields])
+        return json_dumps(record)
+
+    def _get_split_key(self, key):
+        if key is None or callable(key):
+            return super()._get_split_key(key)
+        return lambda record: json_dumps(record.get(key) if isinstance(record, dict) else record)
+
+    def clean(self, n_lines=1000, threaded=False, queue_size=4, checkpoint_interval=None, resume=False):
+        """Clean the input file by applying all selected functions in sequence.
+
+        Args:
+            n_lines (int, optional): number of records to be processed at the same time. Defaults to 1000.
+            threaded (bool, optional): True to read and write in dedicated threads. Defaults to False.
+            queue_size (int, optional): maximum number of batches waiting between two stages
+                when threaded is True. Defaults to 4.
+            checkpoint_interval (float, optional): seconds between two checkpoints. Defaults to None.
+            resume (bool, optional): True to resume from the last checkpoint. Defaults to False.
+        """
+        super().clean(n_lines, threaded, queue_size, checkpoint_interval, resume)
+
+
+class _ChunkedOutput:
+    """Output of a file cleaned as chunks, concatenated in order into savepath once all are cleaned.
+
+    Compressed parts are independent members, so their concatenation is a valid compressed file.
+    Once a chunk failed, the parts are removed as their chunks end and savepath is never written.
+    """
+
+    def __init__(self, savepath: str, n_parts: int):
+        root, extension = os.path.splitext(savepath)
+        self.savepath = savepath
+        self.paths = [f"{root}.part{i:05d}{extension}" for i in range(n_parts)]
+        self._remaining = n_parts
+        self._failed = False
+        self._lock = threading.Lock()
+
+    def done(self, success=True):
+        with self._lock:
+            self._remaining -= 1
+            self._failed = self._failed or not success
+            if self._failed:
+                # chunks still running remove their part when they end, the others never start
+                for path in self.paths:
+                    if os.path.exists(path):
+                        os.remove(path)
+                return
+            if self._remaining:
+                return
+        os.replace(self.paths[0], self.savepath)
+        with open(self.savepath, "ab") as output:
+            for path in self.paths[1:]:
+                with open(path, "rb") as part:
+                    shutil.copyfileobj(part, output, 2 ** 24)
+                os.remove(path)
+
 
 class FolderStreamCleaner:
     """Process all files in a given folder
@@ -479,6 +1089,18 @@ class FolderStreamCleaner:
             Will only be applied when sep is specified.
         header (bool, optional): true if the files contain header. Defaults to None.
         n_jobs (int, optional): number of files to be processed at the same time. Defaults to 4.
+        compression (str, optional): compression of the saved files, see FileStreamCleaner.
+            Defaults to "infer".
+        csv_mode (bool, optional): True to clean the files as CSV/TSV records, see FileStreamCleaner.
+            Defaults to False.
+        include (Union[str, re.Pattern, List], optional): glob patterns (matched against the path relative
+            to folderdir and against the file name) or compiled regexes (searched in the relative path)
+            of the files to clean. Defaults to None (all files).
+        exclude (Union[str, re.Pattern, List], optional): patterns of the files to skip. Defaults to None.
+        min_size (int, optional): minimum size in bytes of the files to clean. Defaults to None.
+        max_size (int, optional): maximum size in bytes of the files to clean. Defaults to None.
+        max_open_files (int, optional): maximum number of file handles opened at the same time by
+            clean_files, each file being cleaned holds two. Defaults to None (2 * n_jobs).
 
     Raises:
         ValueError: if no files are found.
@@ -486,7 +1108,9 @@ class FolderStreamCleaner:
 
     def __init__(
             self, folderdir: str, savedir: str = None, include_subdir=False, encoding="utf8",
-            sep: str = None, columns: List[int] = None, header: bool = None, n_jobs=4) -> None:
+            sep: str = None, columns: List[int] = None, header: bool = None, n_jobs=4,
+            compression="infer", csv_mode=False, include=None, exclude=None, min_size: int = None,
+            max_size: int = None, max_open_files: int = None) -> None:
         self.folderdir = folderdir
         self.savedir = savedir
         self.include_subdir = include_subdir
@@ -495,61 +1119,509 @@ class FolderStreamCleaner:
         self.columns = columns
         self.header = header
         self.n_jobs = n_jobs
-        self.files = self._get_files()
-
-        if len(self.files) == 0:
+        self.compression = compression
+        self.csv_mode = csv_mode
+        self.include = self._as_patterns(include)
+        self.exclude = self._as_patterns(exclude)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_open_files = max_open_files
+        self._files = None
+
+        files = self.iter_files()
+        first = next(files, None)
+        files.close()
+        if first is None:
             raise ValueError(
                 f"No files were found in {folderdir}. You can use 'include_subdir' to look in sub directories.")
         self.apply = BaseCleaner([], stream=True)
 
-    def _get_files(self):
-        if not hasattr(self, 'files'):
-            self.files = []
-            for path, _, filenames in os.walk(self.folderdir):
-                self.files += [os.path.join(path, filename)
-                               for filename in filenames if not filename.startswith('.')]
-                if not self.include_subdir:
-                    break
-        return self.files
+    @staticmethod
+    def _as_patterns(patterns):
+        if patterns is None:
+            return []
+        if isinstance(patterns, (str, re.Pattern)):
+            return [patterns]
+        return list(patterns)
 
-    def clean_file(self, file, sample=False):
+    @staticmethod
+    def _matches(patterns, relpath, name):
+        for pattern in patterns:
+            if isinstance(pattern, re.Pattern):
+                if pattern.search(relpath):
+                    return True
+            elif fnmatch.fnmatchcase(relpath, pattern) or fnmatch.fnmatchcase(name, pattern):
+                return True
+        return False
+
+    def _is_selected(self, entry: os.DirEntry):
+        if entry.name.startswith('.') or SIDECAR_PATTERN.search(entry.name):
+            return False
+        relpath = os.path.relpath(entry.path, self.folderdir).replace(os.sep, "/")
+        if self.include and not self._matches(self.include, relpath, entry.name):
+            return False
+        if self.exclude and self._matches(self.exclude, relpath, entry.name):
+            return False
+        if self.min_size is not None or self.max_size is not None:
+            size = entry.stat().st_size
+            if (self.min_size is not None and size < self.min_size) or \
+                    (self.max_size is not None and size > self.max_size):
+                return False
+        return True
+
+    def iter_files(self):
+        """Lazily yield the paths of the files to clean, as they are found with os.scandir.
+
+        Only one directory is open at a time, and sub directories are visited after their parent.
+        """
+        directories = [self.folderdir]
+        while directories:
+            subdirs = []
+            with os.scandir(directories.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        # like os.walk, symbolic links to directories are not followed
+                        if self.include_subdir and not entry.is_symlink():
+                            subdirs.append(entry.path)
+                    elif entry.is_file() and self._is_selected(entry):
+                        yield entry.path
+            directories.extend(reversed(subdirs))
+
+    @property
+    def files(self):
+        """List of all files to clean, discovered on first access."""
+        if self._files is None:
+            self._files = list(self.iter_files())
+        return self._files
+
+    def clean_file(self, file, sample=False, checkpoint_interval=None, resume=False):
         """Clean a file by applying all selected functions in sequence.
 
         Args:
             file (str): path to the file to be processed
             sample (bool, optional): True to clean a sample (1000 lines) of the file. Defaults to False.
+            checkpoint_interval (float, optional): seconds between two checkpoints, see FileStreamCleaner.clean.
+                Defaults to None.
+            resume (bool, optional): True to resume from the last checkpoint of the file. Defaults to False.
         """
-        savefile = self._get_save_dir(file)
+        with self._get_filestream(file) as filestream:
+            if sample:
+                filestream.clean_sample()
+            else:
+                filestream.clean(checkpoint_interval=checkpoint_interval, resume=resume)
+
+    def _get_filestream(self, file, savefile=None, compression=None):
+        savefile = savefile or self._get_save_dir(file)
         filestream = FileStreamCleaner(
-            file, savefile, sep=self.sep, columns=self.columns, header=self.header)
+            file, savefile, encoding=self.encoding, sep=self.sep, columns=self.columns, header=self.header,
+            compression=compression or self.compression, csv_mode=self.csv_mode)
         filestream._sequential = self.apply._sequential
-        clean_fn = filestream.clean_sample if sample else filestream.clean
-        clean_fn()
+        return filestream
 
     def _get_save_dir(self, file):
+        if not self.savedir:
+            return None
         filedir = file.replace(self.folderdir, "")
         filedir = filedir[1:] if filedir.startswith('/') else filedir
-        savefile = os.path.join(
-            self.savedir, filedir) if self.savedir else None
+        savefile = os.path.join(self.savedir, filedir)
         if not os.path.isdir(os.path.dirname(savefile)):
             os.makedirs(os.path.dirname(savefile))
         return savefile
 
-    def clean_files(self, sample=False):
+    def clean_files(self, sample=False, checkpoint_interval=None, resume=False, chunk_bytes=None,
+                    pack_bytes=None):
         """Clean all files by applying all selected functions in sequence.
 
+        Files are cleaned as they are discovered, or largest first when chunk_bytes or pack_bytes
+        are given, since scheduling by size needs the whole listing.
+
         Args:
             sample (bool, optional): True to clean a sample (1000 lines) of the file. Defaults to False.
+            checkpoint_interval (float, optional): seconds between two checkpoints of each file,
+                see FileStreamCleaner.clean. Defaults to None.
+            resume (bool, optional): True to resume each file from its last checkpoint, skipping the files
+                that were completed. Defaults to False.
+            chunk_bytes (int, optional): files larger than this are cleaned as several chunks of about
+                chunk_bytes bytes in parallel, and the cleaned chunks are concatenated in order.
+                Compressed files and csv_mode are never split. Defaults to None.
+            pack_bytes (int, optional): files smaller than this are packed together into tasks of about
+                pack_bytes bytes, cleaned without a progress bar. Defaults to None.
+
+        Raises:
+            ValueError: If chunk_bytes or pack_bytes are used with sample or checkpoints.
         """
-        self._run(lambda file: self.clean_file(file, sample), self.files)
+        if chunk_bytes or pack_bytes:
+            if sample or checkpoint_interval is not None or resume:
+                raise ValueError("chunk_bytes and pack_bytes are not supported with sample or checkpoints.")
+            tasks = self._schedule(chunk_bytes, pack_bytes)
+            self._run(lambda task: task(), tasks)
+            return
+        self._run(lambda file: self.clean_file(file, sample, checkpoint_interval, resume), self.iter_files())
+
+    def _largest_first(self):
+        return sorted(self.files, key=os.path.getsize, reverse=True)
+
+    def _can_split(self, file):
+        return not self.csv_mode and detect_compression(file) is None
+
+    @staticmethod
+    def _chunk_bounds(file, chunk_bytes):
+        """Split a file into (start, end) byte ranges of about chunk_bytes, aligned on line starts."""
+        size = os.path.getsize(file)
+        starts = [0]
+        with open(file, "rb") as f:
+            while starts[-1] + chunk_bytes < size:
+                # a newline just before the boundary ends the chunk at the boundary
+                f.seek(starts[-1] + chunk_bytes - 1)
+                f.readline()
+                if f.tell() >= size:
+                    break
+                starts.append(f.tell())
+        return list(zip(starts, starts[1:] + [size]))
+
+    def _schedule(self, chunk_bytes=None, pack_bytes=None):
+        """Build the tasks of clean_files: chunks of large files, single files and packs of small
+        files, sorted largest first so that the longest tasks do not start last."""
+        tasks, pack, pack_size = [], [], 0
+        for file in self._largest_first():
+            size = os.path.getsize(file)
+            if chunk_bytes and size > chunk_bytes and self._can_split(file):
+                bounds = self._chunk_bounds(file, chunk_bytes)
+                if len(bounds) > 1:
+                    tasks += self._chunk_tasks(file, bounds)
+                    continue
+            if pack_bytes and size < pack_bytes:
+                pack.append(file)
+                pack_size += size
+                if pack_size >= pack_bytes:
+                    tasks.append((pack_size, partial(self._clean_pack, pack)))
+                    pack, pack_size = [], 0
+                continue
+            tasks.append((size, partial(self.clean_file, file)))
+        if pack:
+            tasks.append((pack_size, partial(self._clean_pack, pack)))
+        return [task for _, task in sorted(tasks, key=lambda task: task[0], reverse=True)]
+
+    def _chunk_tasks(self, file, bounds):
+        filestream = self._get_filestream(file)
+        compression = filestream.compression
+        if compression == "infer":
+            compression = detect_compression(filestream.savepath, use_magic=False)
+        parts = _ChunkedOutput(filestream.savepath, len(bounds))
+
+        def clean_chunk(i, start, end):
+            success = False
+            try:
+                with self._get_filestream(file, parts.paths[i], compression) as chunk:
+                    chunk.progress = False
+                    chunk.clean_range(start, end)
+                success = True
+            finally:
+                parts.done(success)
+
+        return [(end - start, partial(clean_chunk, i, start, end)) for i, (start, end) in enumerate(bounds)]
+
+    def _clean_pack(self, files):
+        for file in files:
+            with self._get_filestream(file) as filestream:
+                filestream.progress = False
+                filestream.clean()
+
+    def clean_files_split(self, splits: dict, seed=0):
+        """Clean all files and split each of them in one pass, see FileStreamCleaner.clean_split.
+
+        Args:
+            splits (dict): mapping from split name to its relative size, e.g. {"train": 0.8, "test": 0.2}.
+            seed (int, optional): seed of the assignment. Defaults to 0.
+        """
+        self._run(lambda file: self._get_filestream(file).clean_split(splits, seed), self.iter_files())
+
+    def clean_files_sharded(self, savedir: str, max_bytes: int = None, max_lines: int = None,
+                            template="part-{:05d}.txt"):
+        """Clean all files into one set of shards of roughly fixed size, written in parallel by n_jobs workers.
+
+        Args:
+            savedir (str): directory of the shards and of the manifest.
+            max_bytes (int, optional): maximum number of (uncompressed) bytes per shard. Defaults to None.
+            max_lines (int, optional): maximum number of lines per shard. Defaults to None.
+            template (str, optional): name template of the shards. Defaults to "part-{:05d}.txt".
+
+        Returns:
+            str: path of the manifest.
+        """
+        output = ShardedOutput(savedir, template, max_bytes, max_lines, self.encoding, self.compression)
+        self._run(lambda file: self._get_filestream(file).clean_sharded(output=output), self.iter_files())
+        return output.write_manifest()
+
+    async def aclean_files(self, sample=False, max_open_files=None, max_inflight_bytes=64 * 2 ** 20,
+                           batch_bytes=2 ** 20, io_workers=None):
+        """Clean all files asynchronously, overlapping reading, cleaning and writing across files.
+
+        Reading and writing run in an I/O thread pool, while cleaning runs in a separate pool
+        of `n_jobs` workers so slow storage can be saturated without over-subscribing the CPU.
+        Files are discovered lazily with iter_files, and at most max_open_files // 2 of them are
+        cleaned at the same time, since each one holds an input and an output handle.
+
+        Args:
+            sample (bool, optional): True to clean only the first batch of each file. Defaults to False.
+            max_open_files (int, optional): maximum number of file handles opened at the same time.
+                Defaults to None. If None, the max_open_files of the cleaner, or 4 * n_jobs, is used.
+            max_inflight_bytes (int, optional): maximum number of bytes read but not yet written,
+                counted as encoded bytes. A batch is charged its actual size once read, so the limit can
+                be exceeded by at most one batch per open file. Defaults to 64 MB.
+            batch_bytes (int, optional): approximate number of bytes read per batch. Defaults to 1 MB.
+            io_workers (int, optional): number of threads used for reading and writing.
+                Defaults to None. If None, max_open_files is used.
+
+        Examples:
+            >>> folder = FolderStreamCleaner('data/', 'cleaned/')
+            >>> folder.apply.remove_links().drop_empty_lines()
+            >>> asyncio.run(folder.aclean_files())
+
+        Raises:
+            ValueError: If csv_mode is True, since rows can span several lines.
+        """
+        import asyncio
+        import concurrent.futures as con
+        if self.csv_mode:
+            raise ValueError("aclean_files does not support csv_mode, use clean_files instead.")
+        max_open_files = max_open_files or self.max_open_files or 4 * self.n_jobs
+        open_files = asyncio.Semaphore(max(1, max_open_files // 2))
+        budget = ByteBudget(max_inflight_bytes)
+        loop = asyncio.get_running_loop()
+        files = self.iter_files()
+        n_done = 0
+        with con.ThreadPoolExecutor(max_workers=io_workers or max_open_files) as io_pool, \
+                con.ThreadPoolExecutor(max_workers=self.n_jobs) as cpu_pool:
+            pending = set()
+            try:
+                while True:
+                    # directories are scanned in the I/O pool, not in the event loop
+                    file = await loop.run_in_executor(io_pool, next, files, None)
+                    if file is None:
+                        break
+                    pending.add(asyncio.ensure_future(
+                        self._aclean_file(file, sample, open_files, budget, batch_bytes, io_pool, cpu_pool)))
+                    if len(pending) >= max_open_files:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            task.result()
+                            n_done += 1
+                            print(f'\n{n_done} has been cleaned.')
+                for task in asyncio.as_completed(pending):
+                    await task
+                    n_done += 1
+                    print(f'\n{n_done} has been cleaned.')
+            except BaseException:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                raise
+
+    async def _aclean_file(self, file, sample, open_files, budget, batch_bytes, io_pool, cpu_pool):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        async with open_files:
+            filestream = self._get_filestream(file)
+            await loop.run_in_executor(io_pool, filestream._prepare_clean)
+            # at most two batches wait between the reader and the cleaner of a single file
+            queue = asyncio.Queue(maxsize=2)
+
+            def read_batch():
+                # the readlines hint counts characters, the budget counts encoded bytes
+                lines = filestream.file.readlines(batch_bytes)
+                return lines, sum(len(line.encode(filestream.encoding)) for line in lines)
+
+            async def read():
+                while True:
+                    acquired = await budget.acquire(batch_bytes)
+                    lines, n_bytes = await loop.run_in_executor(io_pool, read_batch)
+                    acquired = await budget.resize(acquired, n_bytes)
+                    if not lines:
+                        await budget.release(acquired)
+                        break
+                    await queue.put((lines, acquired))
+                    if sample:
+                        break
+                await queue.put(None)
+
+            async def clean_and_write():
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        break
+                    lines, acquired = item
+                    cleaned = await loop.run_in_executor(cpu_pool, filestream._sequential.apply, lines)
+                    await loop.run_in_executor(io_pool, filestream._save_lines, cleaned)
+                    await budget.release(acquired)
+
+            try:
+                await asyncio.gather(read(), clean_and_write())
+            finally:
+                await loop.run_in_executor(io_pool, filestream._close_handlers)
 
     def _run(self, fn, my_iter):
+        """Run fn on each item in n_jobs threads, submitting items as they come, with a bounded
+        number of pending tasks and at most max_open_files // 2 files cleaned at the same time."""
+        import concurrent.futures as con
+        slots = threading.BoundedSemaphore(max(1, self.max_open_files // 2)) if self.max_open_files else None
+
+        def run(item):
+            if slots is None:
+                return fn(item)
+            with slots:
+                return fn(item)
+
+        n_done = 0
         with con.ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
-            futures = []
+            pending = set()
             for item in my_iter:
-                futures.append(executor.submit(fn, item))
-            for i, _ in enumerate(con.as_completed(futures)):
-                print(f'\n{i}/{len(self)} has been cleaned.')
+                if len(pending) >= 2 * self.n_jobs:
+                    done, pending = con.wait(pending, return_when=con.FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                        n_done += 1
+                        print(f'\n{n_done} has been cleaned.')
+                pending.add(executor.submit(run, item))
+            for future in con.as_completed(pending):
+                future.result()
+                n_done += 1
+                print(f'\n{n_done} has been cleaned.')
 
     def __len__(self):
         return len(self.files)
+
+
+class AsyncCleaner:
+    """Serve cleaning requests from many coroutines, cleaning them in batches.
+
+    Requests are coalesced until max_batch_size texts are pending or max_wait seconds have passed
+    since the first one, then the pipeline recorded once on a stream cleaner runs over the whole
+    batch in an executor, and the future of each caller is resolved with its cleaned text. Each
+    text is split on sep and its lines stripped, like TextCleaner, and the lines kept by the
+    pipeline are joined back with sep.
+
+    Args:
+        cleaner (BaseCleaner): stream cleaner with the operations to apply.
+        sep (str, optional): separator to split texts into lines. Defaults to "\\n".
+        max_batch_size (int, optional): maximum number of texts cleaned at once. Defaults to 256.
+        max_wait (float, optional): maximum seconds a request waits for its batch to fill. Defaults to 0.002.
+        executor (concurrent.futures.Executor, optional): executor running the batches. Defaults to None
+            (a single thread owned by the cleaner).
+
+    Raises:
+        ValueError: If the cleaner is not in stream mode or has no operations.
+
+    Examples:
+        >>> pipeline = BaseCleaner(stream=True).remove_links().remove_extra_spaces().strip()
+        >>> async with AsyncCleaner(pipeline) as cleaner:
+        ...     texts = await asyncio.gather(*(cleaner.clean(text) for text in texts))
+    """
+
+    def __init__(self, cleaner: BaseCleaner, sep: str = "\n", max_batch_size=256, max_wait=0.002,
+                 executor=None):
+        if not cleaner.stream:
+            raise ValueError("AsyncCleaner requires a cleaner created with stream=True.")
+        if len(cleaner._sequential) == 0:
+            raise ValueError("Make sure to call the functions you want before start cleaning.")
+        assert max_batch_size > 0, "max_batch_size should be greater than 0"
+        self._sequential = cleaner._sequential
+        # records keep track of their text, so filters can drop lines within a batch
+        self._keyed = all(op.kind in ("map", "filter") for op in self._sequential.operations)
+        self.sep = sep
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._own_executor = executor is None
+        if executor is None:
+            import concurrent.futures as con
+            executor = con.ThreadPoolExecutor(max_workers=1)
+        self._executor = executor
+        self._pending = []
+        self._timer = None
+        self.n_requests = 0
+        self.n_batches = 0
+
+    async def clean(self, text: str) -> str:
+        """Clean a text within the next batch.
+
+        Args:
+            text (str): text to clean.
+
+        Returns:
+            str: cleaned text.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self.n_requests += 1
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        import asyncio
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.n_batches += 1
+        loop = asyncio.get_running_loop()
+        cleaned = loop.run_in_executor(self._executor, self.clean_batch, [text for text, _ in batch])
+        cleaned.add_done_callback(partial(self._resolve, [future for _, future in batch]))
+
+    @staticmethod
+    def _resolve(futures, cleaned):
+        error = cleaned.exception() if not cleaned.cancelled() else None
+        for i, future in enumerate(futures):
+            # the caller may have been cancelled while waiting
+            if future.done():
+                continue
+            if cleaned.cancelled():
+                future.cancel()
+            elif error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(cleaned.result()[i])
+
+    def clean_batch(self, texts: List[str]) -> List[str]:
+        """Clean texts synchronously with a single run of the pipeline.
+
+        Args:
+            texts (List[str]): texts to clean.
+
+        Returns:
+            List[str]: cleaned texts, in order.
+        """
+        line_lists = [self._split(text) for text in texts]
+        if self._keyed:
+            cleaned = [[] for _ in texts]
+            pairs = ((i, line) for i, lines in enumerate(line_lists) for line in lines)
+            for i, line in self._sequential.apply_keyed(pairs):
+                cleaned[i].append(line)
+        else:
+            cleaned = [self._sequential.apply(lines) for lines in line_lists]
+        return [self.sep.join(lines) for lines in cleaned]
+
+    def _split(self, text):
+        # same lines as TextCleaner(text, sep)
+        text = text.strip() if text else ""
+        return [line.strip() for line in text.split(self.sep)] if text else []
+
+    def close(self):
+        """Shut down the executor owned by the cleaner, after the running batches."""
+        if self._own_executor:
+            self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        import asyncio
+        self._flush()
+        if self._own_executor:
+            await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
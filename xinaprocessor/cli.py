@@ -0,0 +1,211 @@
+"""Command line interface, cleaning stdin, files or folders with a pipeline of cleaner operations.
+
+Examples:
+    $ zcat tweets.txt.gz | xinaprocessor --ops strip,remove_links,keep_arabic_only,drop_empty_lines -j 4 > clean.txt
+    $ xinaprocessor --ops "strip,replace_repeated_chars:3:1" data/ -o cleaned/
+    $ xinaprocessor --config pipeline.json corpus.txt > clean.txt
+
+A config file is a JSON object with the "ops" and optionally "batch_size" and "jobs", where each
+operation is a name, a "name:arg:arg" string, or {"name": ..., "args": [...], "kwargs": {...}}.
+"""
+import argparse
+import ast
+import io
+import json
+import os
+import sys
+from collections import deque
+from typing import List, Tuple
+from xinaprocessor.base import BaseCleaner
+from xinaprocessor.helper import iter_batches
+
+# public methods of the cleaners that are not pipeline operations
+NOT_OPERATIONS = {"add_text", "clean_iter", "clear_line_cache", "clear_sequential", "clear_text", "get_lines",
+                  "set_text", "set_workers"}
+DEFAULT_BATCH_SIZE = 10000
+
+# pipeline of the running clean_stream, inherited by the forked workers
+_SEQUENTIAL = None
+
+
+def operation_names() -> List[str]:
+    """Return the names of the operations available to the command line."""
+    # properties such as lines and text are not callable on the class
+    return sorted(name for name in dir(BaseCleaner)
+                  if not name.startswith("_") and name not in NOT_OPERATIONS and callable(getattr(BaseCleaner, name)))
+
+
+def _parse_value(value: str):
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+def parse_operation(spec) -> Tuple[str, list, dict]:
+    """Parse an operation given as "name", "name:arg:arg" or {"name": ..., "args": [...], "kwargs": {...}}.
+
+    Raises:
+        ValueError: If the operation is unknown.
+    """
+    if isinstance(spec, dict):
+        name, args, kwargs = spec["name"], list(spec.get("args", [])), dict(spec.get("kwargs", {}))
+    else:
+        name, *args = spec.strip().split(":")
+        args, kwargs = [_parse_value(arg) for arg in args], {}
+    if name not in operation_names():
+        raise ValueError(f"Unknown operation {name!r}, available operations: {', '.join(operation_names())}")
+    return name, args, kwargs
+
+
+def build_pipeline(cleaner, operations: List[Tuple[str, list, dict]]):
+    """Call the operations on a cleaner, e.g. a stream BaseCleaner or FolderStreamCleaner.apply."""
+    for name, args, kwargs in operations:
+        getattr(cleaner, name)(*args, **kwargs)
+    return cleaner
+
+
+def _clean_batch(batch):
+    return _SEQUENTIAL.apply(batch)
+
+
+def clean_stream(sequential, lines, output, batch_size=DEFAULT_BATCH_SIZE, n_jobs=1):
+    """Clean an iterable of lines into a text output, batch by batch, keeping the order.
+
+    With n_jobs > 1, batches are cleaned in forked processes, with at most 2 * n_jobs batches in flight.
+
+    Args:
+        sequential (Sequential): recorded operations.
+        lines (Iterable[str]): input lines, their line endings are removed.
+        output (io.TextIOBase): output, each cleaned line is written followed by a newline.
+        batch_size (int, optional): number of lines per batch. Defaults to 10000.
+        n_jobs (int, optional): number of worker processes. Defaults to 1.
+    """
+    global _SEQUENTIAL
+    import multiprocessing as mp
+    batches = iter_batches((line.rstrip("\r\n") for line in lines), batch_size)
+
+    def write(cleaned):
+        if cleaned:
+            output.write("\n".join(cleaned) + "\n")
+
+    if n_jobs <= 1 or "fork" not in mp.get_all_start_methods():
+        for batch in batches:
+            write(sequential.apply(batch))
+        return
+    _SEQUENTIAL = sequential
+    try:
+        with mp.get_context("fork").Pool(n_jobs) as pool:
+            pending = deque()
+            for batch in batches:
+                pending.append(pool.apply_async(_clean_batch, (batch,)))
+                if len(pending) >= 2 * n_jobs:
+                    write(pending.popleft().get())
+            while pending:
+                write(pending.popleft().get())
+    finally:
+        _SEQUENTIAL = None
+
+
+def _stream_cleaner(operations):
+    return build_pipeline(BaseCleaner(stream=True), operations)
+
+
+def _iter_input_files(path):
+    from xinaprocessor.cleaners import FolderStreamCleaner
+    if os.path.isdir(path):
+        yield from FolderStreamCleaner(path, include_subdir=True).iter_files()
+    else:
+        yield path
+
+
+def run(args):
+    from xinaprocessor.compression import open_text
+    operations = args.operations
+    if not args.inputs or args.inputs == ["-"]:
+        stdin = io.TextIOWrapper(sys.stdin.buffer, encoding=args.encoding, errors=args.errors)
+        clean_stream(_stream_cleaner(operations)._sequential, stdin, sys.stdout, args.batch_size, args.jobs)
+        return
+    if args.output is None:
+        # inputs are cleaned to stdout one after the other, like cat
+        sequential = _stream_cleaner(operations)._sequential
+        for path in args.inputs:
+            for file in _iter_input_files(path):
+                with open_text(file, "r", args.encoding) as f:
+                    clean_stream(sequential, f, sys.stdout, args.batch_size, args.jobs)
+        return
+    from xinaprocessor.cleaners import FolderStreamCleaner
+    os.makedirs(args.output, exist_ok=True)
+    sequential = None
+    for path in args.inputs:
+        if os.path.isdir(path):
+            folder = FolderStreamCleaner(path, args.output, include_subdir=True, encoding=args.encoding,
+                                         n_jobs=args.jobs)
+            build_pipeline(folder.apply, operations)
+            folder.clean_files()
+        else:
+            # a single file is cleaned like stdin, its batches in args.jobs processes
+            sequential = sequential or _stream_cleaner(operations)._sequential
+            savepath = os.path.join(args.output, os.path.basename(path))
+            with open_text(path, "r", args.encoding) as f, open_text(savepath, "w", args.encoding) as output:
+                clean_stream(sequential, f, output, args.batch_size, args.jobs)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="xinaprocessor",
+        description="Clean Arabic text from stdin, files or folders with a pipeline of cleaner operations.")
+    parser.add_argument("inputs", nargs="*",
+                        help="input files or folders, stdin if empty or '-'. Compressed files are decompressed.")
+    parser.add_argument("--ops", help="comma separated operations, e.g. strip,remove_links,"
+                                      "replace_repeated_chars:3:1,drop_empty_lines")
+    parser.add_argument("--config", help="JSON file with the operations, see the module documentation")
+    parser.add_argument("-o", "--output", help="output folder, stdout if not given")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of parallel workers (default: 1)")
+    parser.add_argument("-b", "--batch-size", type=int, default=None,
+                        help=f"number of lines cleaned at once (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--encoding", default="utf8", help="encoding of the inputs (default: utf8)")
+    parser.add_argument("--errors", default="strict", help="decoding error handling of stdin (default: strict)")
+    parser.add_argument("--list-ops", action="store_true", help="list the available operations and exit")
+    return parser
+
+
+def parse_args(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if args.list_ops:
+        return args
+    config = {}
+    if args.config:
+        with open(args.config, encoding="utf8") as f:
+            config = json.load(f)
+    specs = args.ops.split(",") if args.ops else config.get("ops", [])
+    if not specs:
+        parser.error("no operations, use --ops or --config")
+    try:
+        args.operations = [parse_operation(spec) for spec in specs]
+    except (ValueError, KeyError) as e:
+        parser.error(str(e))
+    args.jobs = args.jobs or config.get("jobs", 1)
+    args.batch_size = args.batch_size or config.get("batch_size", DEFAULT_BATCH_SIZE)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list_ops:
+        print("\n".join(operation_names()))
+        return 0
+    try:
+        run(args)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # the reader (e.g. head) exited, stop quietly without a second error at interpreter exit
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import re
+from collections import deque
+
+COMPRESSION_EXTENSIONS = {
+    ".gz": "gzip",
+    ".gzip": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".lzma": "xz",
+}
+# patterns of the first bytes, bz2 streams start with "BZh" and a block size digit
+COMPRESSION_MAGIC = {
+    re.compile(b"\x1f\x8b"): "gzip",
+    re.compile(b"BZh[1-9]"): "bz2",
+    re.compile(b"\xfd7zXZ\x00"): "xz",
+}
+COMPRESSION_OPENERS = {
+    "gzip": gzip.open,
+    "bz2": bz2.open,
+    "xz": lzma.open,
+}
+COMPRESSION_FUNCTIONS = {
+    "gzip": gzip.compress,
+    "bz2": bz2.compress,
+    "xz": lzma.compress,
+}
+
+
+def detect_compression(path: str, use_magic=True):
+    """Detect the compression format of a file from its extension or its magic bytes.
+
+    Args:
+        path (str): path of the file.
+        use_magic (bool, optional): True to read the first bytes of an existing file when the
+            extension is unknown. Defaults to True.
+
+    Returns:
+        str: one of "gzip", "bz2" and "xz", or None if the file is not compressed.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in COMPRESSION_EXTENSIONS:
+        return COMPRESSION_EXTENSIONS[extension]
+    if use_magic and os.path.isfile(path):
+        with open(path, "rb") as f:
+            start = f.read(6)
+        for magic, compression in COMPRESSION_MAGIC.items():
+            if magic.match(start):
+                return compression
+    return None
+
+
+class ParallelCompressedWriter(io.RawIOBase):
+    """Binary writer that compresses fixed size blocks in a thread pool.
+
+    Each block is written as an independent gzip member (or bz2/xz stream), and the
+    concatenation is a valid file for the standard decompressors. zlib, bz2 and lzma
+    release the GIL, so blocks are compressed in parallel.
+
+    Args:
+        path (str): path of the output file.
+        compression (str, optional): one of "gzip", "bz2" and "xz". Defaults to "gzip".
+        block_size (int, optional): number of uncompressed bytes per block. Defaults to 4 MB.
+        n_workers (int, optional): number of compression threads. Defaults to 4.
+        mode (str, optional): "wb" to truncate the file or "ab" to append to it. Defaults to "wb".
+    """
+
+    def __init__(self, path: str, compression="gzip", block_size=4 * 2 ** 20, n_workers=4, mode="wb"):
+        super().__init__()
+        if compression not in COMPRESSION_FUNCTIONS:
+            raise ValueError(f"Unsupported compression {compression}.")
+        self._compress = COMPRESSION_FUNCTIONS[compression]
+        self.block_size = block_size
+        self.n_workers = n_workers
+        self._file = open(path, mode)
+        import concurrent.futures as con
+        self._executor = con.ThreadPoolExecutor(max_workers=n_workers)
+        self._pending = deque()
+        self._buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._buffer += b
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return len(b)
+
+    def _submit(self, block):
+        self._pending.append(self._executor.submit(self._compress, block))
+        # keep a bounded number of blocks in flight, written in submission order
+        while len(self._pending) > 2 * self.n_workers:
+            self._file.write(self._pending.popleft().result())
+
+    def flush(self):
+        """Compress and write everything that was written so far as complete blocks."""
+        if self.closed or self._file.closed:
+            return
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self._file.write(self._pending.popleft().result())
+        self._file.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown()
+            self._file.close()
+            super().close()
+
+
+class _FlushingBufferedWriter(io.BufferedWriter):
+    # BufferedWriter.flush does not flush the raw stream, where the compressed blocks are pending
+    def flush(self):
+        super().flush()
+        self.raw.flush()
+
+
+def open_text(path: str, mode="r", encoding="utf8", compression="infer", n_workers=4, newline=None):
+    """Open a text file, transparently (de)compressing it.
+
+    Args:
+        path (str): path of the file.
+        mode (str, optional): "r" to read, "w" to write or "a" to append. Defaults to "r".
+        encoding (str, optional): encoding of the text. Defaults to "utf8".
+        compression (str, optional): one of "gzip", "bz2", "xz", None or "infer" to detect it from
+            the extension (and from the magic bytes when reading). Defaults to "infer".
+        n_workers (int, optional): number of threads used to compress the output. Defaults to 4.
+        newline (str, optional): newline translation mode, see the builtin open. Defaults to None.
+
+    Returns:
+        io.TextIOBase: text file object.
+    """
+    if compression == "infer":
+        compression = detect_compression(path, use_magic=mode == "r")
+    if not compression:
+        return open(path, mode, encoding=encoding, newline=newline)
+    if mode == "r":
+        return COMPRESSION_OPENERS[compression](path, "rt", encoding=encoding, newline=newline)
+    writer = ParallelCompressedWriter(path, compression, n_workers=n_workers, mode=mode + "b")
+    return io.TextIOWrapper(_FlushingBufferedWriter(writer), encoding=encoding, newline=newline)
+
+
+def open_binary(path: str, compression="infer"):
+    """Open a file for binary reading, transparently decompressing it.
+
+    Args:
+        path (str): path of the file.
+        compression (str, optional): one of "gzip", "bz2", "xz", None or "infer". Defaults to "infer".
+
+    Returns:
+        io.BufferedIOBase: binary file object.
+    """
+    if compression == "infer":
+        compression = detect_compression(path)
+    if not compression:
+        return open(path, "rb")
+    return COMPRESSION_OPENERS[compression](path, "rb")
@@ -27,6 +27,8 @@ LAM_ALEF_COMBINED = [
     "\ufef5",  # Lam Alef Madda Above
 ]
 LAM_ALEF_NORMAL = "\u0644\u0627"  # ﻻ
+# Arabic Presentation Forms-A and B (and the forms in between), without the byte order mark U+FEFF
+PRESENTATION_FORMS_RANGE = (0xFB50, 0xFEFF)
 HARAKAT_OTHERS = [
     "\u0653",  # Arabic Maddah Above
     "\u0654",  # Arabic Hamza Above
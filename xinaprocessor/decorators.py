@@ -1,35 +1,35 @@
 import warnings
+from functools import wraps
 AVOID = [
         "clear_text",
         "clear_sequential",
-        
+        "set_adaptive_filters",
+        "set_batch_join",
+        "set_line_cache",
+        "set_workers",
+        "clear_line_cache",
+        "clean_iter",
+
         ]
 
 def empty_warning(func):
+    @wraps(func)
     def wrapped(*args, **kwargs):
         result = func(*args, **kwargs)
-        if func.__name__ in AVOID:
+        # lines waiting for worker processes are not computed just to check them, and a stream
+        # cleaner only records the operations, so its lines are always empty
+        if func.__name__ in AVOID or result is None or getattr(result, "_has_pending_lines", False) \
+                or getattr(result, "stream", False):
             return result
-        if len(''.join(result)) == 0:
+        # stops at the first non empty line instead of joining the whole text
+        if not any(result):
             warnings.warn(f'The results out of {func.__name__} function are empty!')
         return result
     return wrapped
 
 def show_empty_warning(cls):
-    class Wrapper:
-        def __init__(self, *args, **kwargs):
-            self.decorated_obj = cls(*args, **kwargs)
-
-        def __getattribute__(self, attribute):
-            try:
-                item = super().__getattribute__(attribute)
-                return item
-            except AttributeError:
-                pass
-            item = self.decorated_obj.__getattribute__(attribute)
-            if type(item) == type(self.__init__):  
-                return empty_warning(item)  
-            else:
-                return item
-
-    return Wrapper
+    # wrap the public methods in place, so subclasses and dunder methods keep working on the same object
+    for name, item in list(vars(cls).items()):
+        if callable(item) and not name.startswith('_') and name not in AVOID:
+            setattr(cls, name, empty_warning(item))
+    return cls
@@ -1,9 +1,40 @@
 from typing import List
 from xinaprocessor.constants import *
 import re
-import emoji
 import random
+import bisect
+import unicodedata
 from collections import Counter
+from functools import lru_cache
+from itertools import accumulate, chain
+
+
+@lru_cache(maxsize=None)
+def get_json_backend():
+    """Return the (loads, dumps) functions of the fastest installed JSON library, imported on first use.
+    orjson is preferred, then ujson, then the standard json module. All of them write compact
+    separators and non-ASCII characters as is, so the output does not depend on the installed library.
+    """
+    try:
+        import orjson
+        return orjson.loads, lambda obj: orjson.dumps(obj).decode("utf-8")
+    except ImportError:
+        pass
+    try:
+        import ujson
+        return ujson.loads, lambda obj: ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False)
+    except ImportError:
+        pass
+    import json
+    return json.loads, lambda obj: json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def json_loads(text: str):
+    return get_json_backend()[0](text)
+
+
+def json_dumps(obj) -> str:
+    return get_json_backend()[1](obj)
 
 
 def replace_list(list_chars, text, replace_with=""):
@@ -15,8 +46,15 @@ def remove_extra_spaces(text: str, keep_spaces=1):
     return re.sub(" +", " " * keep_spaces, "".join(text))
 
 
+@lru_cache(maxsize=None)
+def get_emoji_pattern():
+    """Return the compiled emoji regexp, importing the emoji library and its tables on first use."""
+    import emoji
+    return emoji.get_emoji_regexp()
+
+
 def remove_emoji(text: str):
-    return emoji.get_emoji_regexp().sub("", text)
+    return get_emoji_pattern().sub("", text)
 
 
 def remove_hashtags(text: str):
@@ -33,6 +71,62 @@ def remove_mentions(text: str):
 def remove_emails(text: str):
     return re.sub(r"\S+@\S+", "", text)
 
+# record separator, joins the lines of a batch so that the safe operations run once per batch
+BATCH_SENTINEL = "\x1e"
+
+
+def remove_hashtags_joined(text: str):
+    # same as remove_hashtags on each line, a hashtag at the end of a line is kept
+    return re.sub(r"#[^\n\x1e]*?(?=[^\S\x1e])", "", text)
+
+
+def remove_mentions_joined(text: str):
+    # same as remove_mentions on each line, the sentinel marks the start of a line
+    return re.sub(r" @[\w_]+ | @[\w_]+|(?:^|(?<=\x1e))@[\w_]+ ", " ", text)
+
+
+def replace_repeated_chars_joined(text: str, repeated=1, keep_char=1):
+    # same as replace_repeated_chars on each line, the sentinels of empty lines are never merged
+    assert repeated > 0
+    assert keep_char >= 0
+    pattern = r"([^\n\x1e])\1{}".format(f"{{{repeated-1},}}")
+    return re.sub(pattern, r"\1" * keep_char, text)
+
+
+def map_joined(lines: List[str], fns, batch_fns):
+    """Apply map functions on a batch of lines, running each batch function once on the joined batch.
+
+    The lines are joined with BATCH_SENTINEL, every batch function is applied on the joined text,
+    and the result is split back. A batch function must give the same result as its line function
+    applied on each line, without matching across or changing the sentinel. If a line contains the
+    sentinel, the line functions are applied on each line instead.
+
+    Args:
+        lines (List[str]): batch of lines.
+        fns (List[Callable]): line functions, used as a fallback.
+        batch_fns (List[Callable]): batch functions, in the same order.
+
+    Returns:
+        List[str]: mapped lines.
+    """
+    if not lines:
+        return []
+    joined = BATCH_SENTINEL.join(lines)
+    if joined.count(BATCH_SENTINEL) == len(lines) - 1:
+        for batch_fn in batch_fns:
+            joined = batch_fn(joined)
+        result = joined.split(BATCH_SENTINEL)
+        if len(result) == len(lines):
+            return result
+    for fn in fns:
+        lines = [fn(line) for line in lines]
+    return lines
+
+def map_joined_batches(fn, batch_fn, batch_size: int, lines):
+    """Apply map_joined on consecutive batches of batch_size lines."""
+    return chain.from_iterable(map_joined(batch, [fn], [batch_fn]) for batch in iter_batches(lines, batch_size))
+
+
 def contains_single_char(text: str):
     return True if re.search(r"(?:^| )\w(?:$| )", text) else False
 
@@ -90,8 +184,8 @@ def contains_repeated_chars(text: str, repeated=1):
 def train_test_split(x: list, test_size: float, random_seed=None):
     assert test_size > 0.0 and test_size < 1.0, "test size sould be between 0 and 1"
     assert len(x) > 1, "the length of the given list should be greater than 1"
-    if random_seed:
-        random.random(random_seed).shuffle(x)
+    if random_seed is not None:
+        random.Random(random_seed).shuffle(x)
     else:
         random.shuffle(x)
     test = x[: int(len(x) * test_size)]
@@ -99,6 +193,61 @@ def train_test_split(x: list, test_size: float, random_seed=None):
     return train, test
 
 
+def hash_splitter(ratios: List[float], seed=0):
+    """Return a function deterministically assigning a key to a split, using a keyed hash of its content.
+
+    The assignment only depends on the key, the ratios and the seed, so it is reproducible across
+    runs, processes and machines, and identical keys always go to the same split. The split
+    bounds are computed once, so the returned function is cheap to call on every line.
+
+    Args:
+        ratios (List[float]): relative size of each split, e.g. [0.8, 0.1, 0.1].
+        seed (int, optional): seed to get a different assignment. Defaults to 0.
+
+    Returns:
+        Callable[[str], int]: function returning the index of the split of a key.
+    """
+    from hashlib import blake2b
+    total = sum(ratios)
+    # upper bound of each split in the 64 bits hash space
+    bounds = [position / total * 2 ** 64 for position in accumulate(ratios)]
+    seed_key = str(seed).encode("utf-8")
+    last = len(ratios) - 1
+
+    def split(key: str) -> int:
+        digest = blake2b(key.encode("utf-8"), digest_size=8, key=seed_key).digest()
+        return min(bisect.bisect_right(bounds, int.from_bytes(digest, "big")), last)
+    return split
+
+
+def hash_split(key: str, ratios: List[float], seed=0) -> int:
+    """Assign a single key to a split, see hash_splitter.
+
+    Args:
+        key (str): content to hash, e.g. a line or a record id.
+        ratios (List[float]): relative size of each split, e.g. [0.8, 0.1, 0.1].
+        seed (int, optional): seed to get a different assignment. Defaults to 0.
+
+    Returns:
+        int: index of the split.
+    """
+    return hash_splitter(ratios, seed)(key)
+
+
+def iter_batches(iterable, batch_size: int):
+    """Yield lists of at most batch_size consecutive items of an iterable.
+    """
+    assert batch_size > 0, "batch size should be greater than 0"
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 def export_text(file_path, data: list, sep="\n", encoding="utf-8"):
     with open(file_path, "a", encoding=encoding) as f:
         f.write(sep.join(data))
@@ -127,4 +276,89 @@ def doc_count_frequency(texts: list, split_by= " ", word_level= True):
     return str_count_frequency(text, sep= split_by, word_level= word_level)
 
 def swap_tanween_alef(text: str):
-    return text.replace(TANWEEN + NORMAL_ALEF, NORMAL_ALEF + TANWEEN)
\ No newline at end of file
+    return text.replace(TANWEEN + NORMAL_ALEF, NORMAL_ALEF + TANWEEN)
+
+PRESENTATION_CANDIDATES = re.compile("[{}-{}]".format(*map(chr, (PRESENTATION_FORMS_RANGE[0],
+                                                                  PRESENTATION_FORMS_RANGE[1] - 1))))
+
+
+@lru_cache(maxsize=None)
+def get_presentation_table():
+    """Build the table folding presentation forms to their NFKC decomposition, used by str.translate.
+
+    Returns:
+        dict: mapping from codepoint to its folded text, for the forms that NFKC changes.
+    """
+    table = {}
+    for code in range(*PRESENTATION_FORMS_RANGE):
+        folded = unicodedata.normalize("NFKC", chr(code))
+        if folded != chr(code):
+            table[code] = folded
+    return table
+
+
+def fold_presentation_forms(text: str):
+    # lines without candidate codepoints are returned as is
+    if not PRESENTATION_CANDIDATES.search(text):
+        return text
+    return text.translate(get_presentation_table())
+
+
+def normalize_unicode(text: str, form="NFKC"):
+    if form in ("NFKC", "NFKD"):
+        text = fold_presentation_forms(text)
+    # the quick check answers without allocating for most lines
+    if unicodedata.is_normalized(form, text):
+        return text
+    return unicodedata.normalize(form, text)
+
+# script classes of the codepoint table, later classes take precedence when a character is in several
+SCRIPT_CLASSES = ["other", "space", "punctuation", "digit", "latin", "emoji",
+                  "persian", "quranic", "harakat", "arabic"]
+# class codes are private use characters, so a single translate call maps a line to its classes
+SCRIPT_CODES = {name: chr(0xE000 + i) for i, name in enumerate(SCRIPT_CLASSES)}
+
+
+@lru_cache(maxsize=None)
+def get_script_table():
+    """Build the codepoint classification table used by str.translate, from the constants.
+
+    Returns:
+        dict: mapping from codepoint to the code character of its script class.
+    """
+    import emoji
+    chars = {
+        "space": " \t\n\r\x0b\x0c\xa0\u200c\u200d",
+        "punctuation": PUNCTUATION,
+        "digit": ENGLISH_NUM + ARABIC_NUM + FARISI_NUM,
+        "latin": ENGLISH_CHARS,
+        "emoji": [e for e in emoji.UNICODE_EMOJI if len(e) == 1],
+        "persian": PERSIAN_UNIQUE_CHARS + [chr(c) for c in range(0xFB50, 0xFBA0)],
+        "quranic": QURANIC_ANNOTATION + HONORIFIC_SIGN,
+        "harakat": HARAKAT + [TATWEEL],
+        "arabic": ARABIC_CHARS,
+    }
+    # literal code characters in the text are counted as other characters
+    table = {ord(code): SCRIPT_CODES["other"] for code in SCRIPT_CODES.values()}
+    for name in SCRIPT_CLASSES[1:]:
+        table.update((ord(char), SCRIPT_CODES[name]) for char in chars[name])
+    return table
+
+
+def script_counts(text: str) -> dict:
+    """Count the characters of each script class in one table-driven pass.
+
+    Returns:
+        dict: number of characters per class in SCRIPT_CLASSES.
+    """
+    counts = Counter(text.translate(get_script_table()))
+    result = {name: counts.get(code, 0) for name, code in SCRIPT_CODES.items() if name != "other"}
+    result["other"] = len(text) - sum(result.values())
+    return result
+
+
+def script_ratios(counts: dict) -> dict:
+    """Convert script counts to ratios over all characters except spaces.
+    """
+    total = sum(counts.values()) - counts["space"]
+    return {name: (count / total if total else 0.0) for name, count in counts.items() if name != "space"}
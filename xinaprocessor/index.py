@@ -0,0 +1,144 @@
+import hashlib
+import os
+import re
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+
+INDEX_MAGIC = b"XPIDX\x00\x01\x00"
+# magic, indexed file size, file mtime in ns, last bytes of the indexed content
+INDEX_HEADER = struct.Struct("<8sQq64s")
+INDEX_SUFFIX = ".idx"
+
+
+def cached_index_path(filepath: str, cache_dir: str) -> str:
+    """Return the path of the index of a file in a cache directory, unique per absolute path."""
+    digest = hashlib.sha1(os.path.abspath(filepath).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{os.path.basename(filepath)}.{digest}{INDEX_SUFFIX}")
+
+
+class LineIndex(Sequence):
+    """Index of the line start offsets of a file, optionally persisted to a sidecar file.
+
+    The index is built in one pass over the file. When index_path or cache_dir is given, it is
+    saved there and reused as long as the size and the modification time of the file match, and
+    only the new part is scanned when the file grows. Nothing is written next to the input unless
+    index_path points there. As a sequence, it contains the (start, end) byte offsets of each
+    line, where end excludes the newline.
+
+    Args:
+        filepath (str): path of the indexed file.
+        index_path (str, optional): path of the sidecar file. Defaults to None.
+        cache_dir (str, optional): directory of the sidecar file when index_path is None, created
+            if needed. Defaults to None. If both are None, the index is only kept in memory.
+        chunk_size (int, optional): number of bytes read at once while indexing. Defaults to 16 MB.
+    """
+    _newline = re.compile(b"\n")
+
+    def __init__(self, filepath: str, index_path: str = None, cache_dir: str = None, chunk_size=2 ** 24):
+        if not os.path.isfile(filepath):
+            raise FileNotFoundError(f"File {filepath} does not exist.")
+        self.filepath = filepath
+        if index_path is None and cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            index_path = cached_index_path(filepath, cache_dir)
+        self.index_path = index_path
+        self.chunk_size = chunk_size
+        # offset 0 and the offset following each newline
+        self.starts = array("Q", [0])
+        self.size = 0
+        self.mtime_ns = None
+        self._tail = b""
+        self.update()
+
+    def update(self):
+        """Bring the index up to date with the file, loading, extending or rebuilding it as needed.
+
+        Returns:
+            LineIndex: self
+        """
+        stat = os.stat(self.filepath)
+        if stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns:
+            return self
+        if self.mtime_ns is None:
+            self._load()
+        if stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns:
+            return self
+        if not (stat.st_size > self.size and self._tail_matches()):
+            self.starts, self.size = array("Q", [0]), 0
+        self._scan(stat.st_size)
+        self.mtime_ns = stat.st_mtime_ns
+        self._save()
+        return self
+
+    def _read_tail(self, size):
+        with open(self.filepath, "rb") as f:
+            f.seek(max(0, size - 64))
+            return f.read(min(size, 64))
+
+    def _tail_matches(self):
+        # the file only grew if the end of the indexed content is unchanged
+        return self.size == 0 or self._read_tail(self.size) == self._tail
+
+    def _scan(self, size):
+        with open(self.filepath, "rb") as f:
+            f.seek(self.size)
+            position = self.size
+            while position < size:
+                chunk = f.read(min(self.chunk_size, size - position))
+                if not chunk:
+                    break
+                self.starts.extend(position + m.end() for m in self._newline.finditer(chunk))
+                position += len(chunk)
+        self.size = position
+        self._tail = self._read_tail(position)
+
+    def _load(self):
+        if self.index_path is None:
+            return
+        try:
+            with open(self.index_path, "rb") as f:
+                magic, size, mtime_ns, tail = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+                if magic != INDEX_MAGIC:
+                    return
+                starts = array("Q")
+                starts.frombytes(f.read())
+        except (OSError, struct.error, ValueError):
+            return
+        if sys.byteorder != "little":
+            starts.byteswap()
+        if not starts or starts[0] != 0:
+            return
+        self.starts, self.size, self.mtime_ns = starts, size, mtime_ns
+        self._tail = tail[:min(size, 64)]
+
+    def _save(self):
+        if self.index_path is None:
+            return
+        starts = array("Q", self.starts)
+        if sys.byteorder != "little":
+            starts.byteswap()
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(INDEX_HEADER.pack(INDEX_MAGIC, self.size, self.mtime_ns, self._tail))
+                starts.tofile(f)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            # a read only directory still gets an in-memory index
+            pass
+
+    def __len__(self):
+        return len(self.starts) - (1 if self.starts[-1] == self.size else 0)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if item < 0 or item >= len(self):
+            raise IndexError(
+                f"Index must be in range [0,{len(self)}]. Your input: {item}")
+        end = self.starts[item + 1] - 1 if item + 1 < len(self.starts) else self.size
+        return self.starts[item], end
@@ -0,0 +1,119 @@
+import multiprocessing as mp
+import concurrent.futures as con
+import struct
+from itertools import accumulate, count, islice
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Dict, List, Sequence
+from array import array
+
+# operations of the running parallel_apply calls by call id, inherited by the forked workers, so
+# that lambdas and closures do not need to be pickled. Each call has its own entry, so calls from
+# several threads do not overwrite each other's operations.
+_OPERATIONS: Dict[int, List[Callable]] = {}
+_call_ids = count()
+# number of lines, layout and number of payload bytes of a packed buffer
+PACK_HEADER = struct.Struct("<QQQ")
+# lines joined by newlines, or offsets followed by the encoded lines when a line contains a newline
+PACK_JOINED, PACK_OFFSETS = 0, 1
+
+
+def can_fork():
+    """True if worker processes can be forked, which parallel_apply requires."""
+    return "fork" in mp.get_all_start_methods()
+
+
+def pack_lines(lines: Sequence[str]) -> SharedMemory:
+    """Copy lines to a new shared memory block, as utf-8 bytes.
+
+    Args:
+        lines (Sequence[str]): lines to pack.
+
+    Returns:
+        SharedMemory: shared memory block, to be closed and unlinked by the reader.
+    """
+    joined = "\n".join(lines)
+    if not lines or joined.count("\n") == len(lines) - 1:
+        layout, payload = PACK_JOINED, joined.encode("utf-8")
+    else:
+        encoded = [line.encode("utf-8") for line in lines]
+        offsets = array("Q", accumulate(map(len, encoded), initial=0))
+        layout, payload = PACK_OFFSETS, offsets.tobytes() + b"".join(encoded)
+    shm = SharedMemory(create=True, size=PACK_HEADER.size + max(len(payload), 1))
+    shm.buf[:PACK_HEADER.size] = PACK_HEADER.pack(len(lines), layout, len(payload))
+    shm.buf[PACK_HEADER.size:PACK_HEADER.size + len(payload)] = payload
+    return shm
+
+
+def unpack_lines(buf) -> List[str]:
+    """Decode the lines of a buffer filled by pack_lines."""
+    n_lines, layout, size = PACK_HEADER.unpack(buf[:PACK_HEADER.size])
+    payload = bytes(buf[PACK_HEADER.size:PACK_HEADER.size + size])
+    if n_lines == 0:
+        return []
+    if layout == PACK_JOINED:
+        return payload.decode("utf-8").split("\n")
+    offsets = array("Q")
+    offsets.frombytes(payload[:(n_lines + 1) * offsets.itemsize])
+    data = payload[(n_lines + 1) * offsets.itemsize:]
+    return [data[start:end].decode("utf-8") for start, end in zip(offsets, islice(offsets, 1, None))]
+
+
+def _read_shared(name: str, unlink=False) -> List[str]:
+    shm = SharedMemory(name=name)
+    try:
+        return unpack_lines(shm.buf)
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+
+def _run_partition(call_id: int, name: str):
+    lines = _read_shared(name)
+    for fnc in _OPERATIONS[call_id]:
+        lines = fnc(lines)
+    result = pack_lines(list(lines))
+    result.close()
+    return result.name
+
+
+def parallel_apply(lines: Sequence[str], operations: List[Callable], n_workers: int, n_partitions=None):
+    """Apply operations on contiguous partitions of the lines in forked worker processes.
+
+    Partitions are sent to the workers, and sent back, as packed buffers in shared memory instead
+    of pickled lists. Each operation takes an iterable of lines and returns an iterable of lines
+    (e.g. partial(map, fn) or partial(filter, fn)), and must not depend on other partitions. Side
+    effects of the operations (e.g. a report of the dropped lines) stay in the workers.
+
+    Args:
+        lines (Sequence[str]): lines to process.
+        operations (List[Callable]): operations to apply in order on each partition.
+        n_workers (int): number of worker processes.
+        n_partitions (int, optional): number of partitions. Defaults to None (4 per worker).
+
+    Returns:
+        Iterator[str]: processed lines, in the original order.
+    """
+    n_partitions = n_partitions or 4 * n_workers
+    bounds = [(len(lines) * i // n_partitions, len(lines) * (i + 1) // n_partitions)
+              for i in range(n_partitions)]
+    inputs = []
+    call_id = next(_call_ids)
+    try:
+        inputs = [pack_lines(lines[start:end]) for start, end in bounds if end > start]
+        _OPERATIONS[call_id] = operations
+        with con.ProcessPoolExecutor(n_workers, mp_context=mp.get_context("fork")) as executor:
+            futures = [executor.submit(_run_partition, call_id, shm.name) for shm in inputs]
+        # leaving the executor waits for all partitions
+    finally:
+        _OPERATIONS.pop(call_id, None)
+        for shm in inputs:
+            shm.close()
+            shm.unlink()
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    names = [future.result() for future in futures if future.exception() is None]
+    if errors:
+        for name in names:
+            _read_shared(name, unlink=True)
+        raise errors[0]
+    return (line for name in names for line in _read_shared(name, unlink=True))
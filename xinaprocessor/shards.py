@@ -0,0 +1,141 @@
+import itertools
+import json
+import os
+import threading
+from typing import List
+from xinaprocessor.compression import open_text
+
+MANIFEST_NAME = "manifest.json"
+
+
+class ShardedWriter:
+    """Text writer that rotates its output to a new shard by byte size or line count.
+
+    Rotation only happens between two calls to `write`, so lines and records are never cut.
+    Writers are created by ShardedOutput, which gives the shard numbers and collects the manifest.
+
+    Args:
+        output (ShardedOutput): output the shards belong to.
+        header (str, optional): text written at the start of every shard. Defaults to None.
+    """
+
+    def __init__(self, output, header: str = None):
+        self.output = output
+        self.header = header
+        self._file = None
+        self._entry = None
+
+    def _rotate(self):
+        self._close_shard()
+        path = self.output.next_path()
+        self._file = open_text(path, "w", self.output.encoding, self.output.compression,
+                               self.output.compress_workers)
+        self._entry = {"path": os.path.relpath(path, self.output.savedir), "lines": 0, "bytes": 0}
+        if self.header:
+            self._write(self.header)
+
+    def _write(self, text: str):
+        self._file.write(text)
+        self._entry["lines"] += text.count("\n")
+        self._entry["bytes"] += len(text.encode(self.output.encoding))
+
+    def write(self, text: str):
+        if self._file is None or self.output.is_full(self._entry):
+            self._rotate()
+        self._write(text)
+        return len(text)
+
+    def _close_shard(self):
+        if self._file is not None:
+            self._file.close()
+            self._entry["size"] = os.path.getsize(os.path.join(self.output.savedir, self._entry["path"]))
+            self.output.add_entry(self._entry)
+            self._file = None
+
+    def close(self):
+        self._close_shard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ShardedOutput:
+    """Set of output shards of size roughly `max_bytes` or `max_lines`, named after a template.
+
+    Several ShardedWriter objects can write in parallel (one per worker) while sharing the shard
+    numbering and a single manifest that lists the line and byte counts of each shard.
+
+    Args:
+        savedir (str): directory of the shards.
+        template (str, optional): name template of the shards, formatted with the shard number.
+            Defaults to "part-{:05d}.txt".
+        max_bytes (int, optional): maximum number of (uncompressed) bytes per shard. Defaults to None.
+        max_lines (int, optional): maximum number of lines per shard. Defaults to None.
+        encoding (str, optional): encoding of the shards. Defaults to "utf8".
+        compression (str, optional): compression of the shards, see compression.open_text.
+            Defaults to "infer".
+        compress_workers (int, optional): number of threads used to compress each shard. Defaults to 4.
+
+    Examples:
+        >>> output = ShardedOutput('shards/', max_lines=1000000)
+        >>> with output.writer() as writer:
+        ...     writer.write('line\\n')
+        >>> output.write_manifest()
+    """
+
+    def __init__(self, savedir: str, template="part-{:05d}.txt", max_bytes: int = None, max_lines: int = None,
+                 encoding="utf8", compression="infer", compress_workers=4):
+        if max_bytes is None and max_lines is None:
+            raise ValueError("max_bytes or max_lines must be specified.")
+        os.makedirs(savedir, exist_ok=True)
+        self.savedir = savedir
+        self.template = template
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        self.encoding = encoding
+        self.compression = compression
+        self.compress_workers = compress_workers
+        self.manifest: List[dict] = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def next_path(self):
+        with self._lock:
+            index = next(self._counter)
+        return os.path.join(self.savedir, self.template.format(index))
+
+    def is_full(self, entry: dict):
+        return (self.max_bytes is not None and entry["bytes"] >= self.max_bytes) or \
+            (self.max_lines is not None and entry["lines"] >= self.max_lines)
+
+    def add_entry(self, entry: dict):
+        with self._lock:
+            self.manifest.append(entry)
+
+    def writer(self, header: str = None):
+        """Create a new writer on this output, one per worker.
+
+        Args:
+            header (str, optional): text written at the start of every shard. Defaults to None.
+        """
+        return ShardedWriter(self, header)
+
+    def write_manifest(self, name=MANIFEST_NAME):
+        """Write the manifest of all closed shards as JSON in savedir.
+
+        Returns:
+            str: path of the manifest.
+        """
+        shards = sorted(self.manifest, key=lambda entry: entry["path"])
+        manifest = {
+            "shards": shards,
+            "lines": sum(entry["lines"] for entry in shards),
+            "bytes": sum(entry["bytes"] for entry in shards),
+        }
+        path = os.path.join(self.savedir, name)
+        with open(path, "w", encoding="utf8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        return path
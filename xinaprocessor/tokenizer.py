@@ -0,0 +1,129 @@
+import re
+from array import array
+from collections import Counter
+from typing import Iterable, List, Tuple
+from xinaprocessor.constants import (ARABIC_CHARS, ARABIC_NUM, ENGLISH_CHARS, ENGLISH_NUM, FARISI_NUM,
+                                     HARAKAT, PERSIAN_UNIQUE_CHARS, PUNCTUATION, TATWEEL)
+
+# typecode of the offset arrays, lines are assumed to be shorter than 4G characters
+SPAN_TYPECODE = "I"
+
+
+def _char_class(chars):
+    return "".join(re.escape(char) for char in chars if len(char) == 1)
+
+
+class Tokenizer:
+    """Arabic aware tokenizer that returns token boundaries instead of substrings.
+
+    Tokens are runs of Arabic letters (with harakat and tatweel), runs of Latin letters, numbers
+    (with "." "," and "٫" between digits), single punctuation marks, and runs of any other
+    non space characters. Spans are flat arrays of (start, end) offsets, so tokenizing a line
+    allocates a single array, and the helpers of this module work on the spans directly.
+
+    Args:
+        split_conjunctions (bool, optional): True to split the conjunctions attached to a word
+            starting with the definite article, e.g. "والكتاب" to "و" and "الكتاب". Defaults to False.
+        conjunctions (str, optional): conjunction letters to split. Defaults to "وف".
+
+    Examples:
+        >>> tokenizer = Tokenizer(split_conjunctions=True)
+        >>> spans = tokenizer.spans("والكتاب، 12.5 kg")
+        >>> list(spans)
+        [0, 1, 1, 7, 7, 8, 9, 13, 14, 16]
+        >>> list(iter_tokens("والكتاب، 12.5 kg", spans))
+        ['و', 'الكتاب', '،', '12.5', 'kg']
+    """
+
+    def __init__(self, split_conjunctions=False, conjunctions="وف"):
+        self.split_conjunctions = split_conjunctions
+        self.conjunctions = conjunctions
+        arabic = _char_class(ARABIC_CHARS + TATWEEL + "".join(HARAKAT + PERSIAN_UNIQUE_CHARS))
+        latin = _char_class(ENGLISH_CHARS)
+        digits = _char_class(ENGLISH_NUM + ARABIC_NUM + FARISI_NUM)
+        punctuation = _char_class(PUNCTUATION)
+        alternatives = []
+        if split_conjunctions:
+            alternatives.append(f"(?<![{arabic}])[{_char_class(conjunctions)}](?=ال[{arabic}])")
+        alternatives += [
+            f"[{arabic}]+",
+            f"[{latin}]+",
+            f"[{digits}]+(?:[.,٫][{digits}]+)*",
+            f"[{punctuation}]",
+            f"[^\\s{arabic}{latin}{digits}{punctuation}]+",
+        ]
+        self._pattern = re.compile("|".join(alternatives))
+
+    def spans(self, text: str) -> array:
+        """Return the flat (start, end) offsets of the tokens of a line.
+
+        Args:
+            text (str): line to tokenize.
+
+        Returns:
+            array: [start_0, end_0, start_1, end_1, ...]
+        """
+        spans = array(SPAN_TYPECODE)
+        for match in self._pattern.finditer(text):
+            spans.extend(match.span())
+        return spans
+
+    def spans_batch(self, lines: Iterable[str]) -> Tuple[array, array]:
+        """Tokenize a batch of lines into a single array of spans.
+
+        Args:
+            lines (Iterable[str]): lines to tokenize.
+
+        Returns:
+            Tuple[array, array]: flat (start, end) offsets of all tokens, relative to their line,
+                and the index of the first token of each line, followed by the number of tokens.
+        """
+        spans = array(SPAN_TYPECODE)
+        line_starts = array(SPAN_TYPECODE, [0])
+        finditer = self._pattern.finditer
+        for line in lines:
+            for match in finditer(line):
+                spans.extend(match.span())
+            line_starts.append(len(spans) // 2)
+        return spans, line_starts
+
+
+def line_spans(spans: array, line_starts: array, i: int) -> memoryview:
+    """Return a view, without copy, on the spans of line i of a batch tokenized by spans_batch."""
+    return memoryview(spans)[2 * line_starts[i]:2 * line_starts[i + 1]]
+
+
+def count_tokens(spans) -> int:
+    return len(spans) // 2
+
+
+def token_lengths(spans) -> array:
+    """Return the number of characters of each token."""
+    return array(SPAN_TYPECODE, (spans[i + 1] - spans[i] for i in range(0, len(spans), 2)))
+
+
+def has_token_of_length(spans, length: int) -> bool:
+    return any(spans[i + 1] - spans[i] == length for i in range(0, len(spans), 2))
+
+
+def iter_tokens(text: str, spans):
+    """Lazily yield the tokens of a line, only the consumed tokens are copied."""
+    for i in range(0, len(spans), 2):
+        yield text[spans[i]:spans[i + 1]]
+
+
+def token_frequency(lines: List[str], spans: array, line_starts: array) -> Counter:
+    """Count the tokens of a batch tokenized by spans_batch.
+
+    Args:
+        lines (List[str]): tokenized lines.
+        spans (array): spans returned by spans_batch.
+        line_starts (array): line starts returned by spans_batch.
+
+    Returns:
+        Counter: frequency of each token.
+    """
+    counter = Counter()
+    for i, line in enumerate(lines):
+        counter.update(iter_tokens(line, line_spans(spans, line_starts, i)))
+    return counter